@@ -0,0 +1,225 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as splinalg
+import gurobipy as gp
+from gurobipy import GRB
+
+# The demand for product i in week w is
+#     Intercept[i,w] + Own[i,w]*p[i,w] + Cross[i,w]*(prices of the other products in week w)
+# so the revenue of week w is a_w'p_w + p_w'B_w p_w with a_w the intercepts,
+# Own on the diagonal of B_w and Cross in the off-diagonal entries of row i.
+# Stacking the weeks gives revenue(p) = a'p + p'Qp where Q (the symmetric
+# part of the B_w) is block diagonal with one products x products block per week.
+# The prices are ordered week by week: index = week position * len(products) + product position.
+class PriceResponse:
+
+    def __init__(self, df):
+        self.weeks = sorted(int(w) for w in df['Week'].unique())
+        self.products = list(df['Product'].unique())
+        n = len(self.products)
+        self.a = np.zeros(len(self.weeks)*n)
+        self.blocks = np.zeros((len(self.weeks), n, n))
+        for row in df.itertuples(index=False):
+            k = self.index(row.Product, int(row.Week))
+            block = self.blocks[self.weeks.index(int(row.Week))]
+            i = self.products.index(row.Product)
+            self.a[k] = row.Intercept
+            block[i, :] = row.Cross_Price_Coefficient
+            block[i, i] = row.Own_Price_Coefficient
+
+        # Only the symmetric part of each block contributes to p'Bp
+        self.blocks = 0.5*(self.blocks + self.blocks.transpose(0, 2, 1))
+        self.Q = sparse.block_diag(list(self.blocks), format='csr')
+
+    # The position of the price of a product in a given week
+    def index(self, product, week):
+        return self.weeks.index(week)*len(self.products) + self.products.index(product)
+
+    # The revenue of a price vector
+    def revenue(self, prices):
+        return float(self.a @ prices + prices @ (self.Q @ prices))
+
+    # The revenue is concave if and only if every block of the Hessian 2Q is
+    # negative semidefinite (checked block by block, no solve needed)
+    def is_concave(self, tolerance=1e-9):
+        return bool(np.all(np.linalg.eigvalsh(self.blocks) <= tolerance))
+
+# Build the revenue-maximization QP with the matrix API. The prices are one
+# MVar (returned with the model). NonConvex is only switched on when the
+# Hessian is not negative semidefinite; a concave objective is a convex QP.
+def build_pricing_model(response, name="Dynamic Pricing"):
+    m = gp.Model(name)
+    p = m.addMVar(len(response.a), lb=0.0, name="price")
+    m.setObjective(p @ response.Q @ p + response.a @ p, GRB.MAXIMIZE)
+    if not response.is_concave():
+        m.setParam('NonConvex', 2)
+    return m, p
+
+# Equality constraints that hold the price of every product constant within
+# each group of weeks (e.g. [[1, 2, 3, 4], [5, 6, 7, 8]]): rows of A p = 0
+def static_price_constraints(response, groups):
+    rows = []
+    for group in groups:
+        for product in response.products:
+            for week in group[1:]:
+                rows.append((response.index(product, group[0]), response.index(product, week)))
+    A = sparse.lil_matrix((len(rows), len(response.a)))
+    for r, (i, j) in enumerate(rows):
+        A[r, i] = 1.0
+        A[r, j] = -1.0
+    return A.tocsr(), np.zeros(len(rows))
+
+# The fast path for the equality-constrained case: maximize a'p + p'Qp
+# subject to A p = b is solved by the KKT system
+#     [ 2Q  A' ] [ p ]   [ -a ]
+#     [ A   0  ] [ l ] = [  b ]
+# This is the optimum when the revenue is concave and no price bound is
+# active; otherwise None is returned and the QP has to be solved instead.
+def kkt_solve(response, A=None, b=None):
+    if not response.is_concave():
+        return None
+    if A is None or A.shape[0] == 0:
+        kkt, rhs = 2*response.Q, -response.a
+    else:
+        kkt = sparse.bmat([[2*response.Q, A.T], [A, None]], format='csc')
+        rhs = np.concatenate((-response.a, b))
+    solution = splinalg.spsolve(sparse.csc_matrix(kkt), rhs)[:len(response.a)]
+    if not np.all(np.isfinite(solution)) or np.any(solution < 0):
+        return None
+    return solution
+
+# Solve the equality-constrained pricing problem: the KKT system when it
+# applies, the QP otherwise. Returns the prices and the revenue.
+def solve_pricing(response, A=None, b=None, name="Dynamic Pricing"):
+    prices = kkt_solve(response, A, b)
+    if prices is None:
+        m, p = build_pricing_model(response, name)
+        m.setParam('OutputFlag', 0)
+        if A is not None and A.shape[0] > 0:
+            m.addConstr(A @ p == b)
+        m.optimize()
+        if m.status != GRB.OPTIMAL:
+            raise RuntimeError("The pricing model ended with status %d" % m.status)
+        prices = p.X
+    return prices, response.revenue(prices)
+
+# A pricing policy is a list of rules (dicts) on the weekly prices of every product:
+#   {'name': ..., 'kind': 'static',  'weeks': W}                    equal prices in the weeks W
+#   {'name': ..., 'kind': 'below',   'weeks': W, 'reference': R, 'amount': d}
+#                                     p[w] <= p[r] - d for w in W, r in R
+#   {'name': ..., 'kind': 'above',   'weeks': W, 'reference': R, 'amount': d}
+#                                     p[w] >= p[r] + d for w in W, r in R
+#   {'name': ..., 'kind': 'between', 'weeks': W, 'lower': L, 'upper': U}
+#                                     p[l] <= p[w] <= p[u] for w in W, l in L, u in U
+# Every rule becomes rows  p[i] - p[j] (sense) amount  for each product. The
+# rows are returned as (i, j, sense, scales) where the right-hand side of a
+# row is its scale times the amount of the rule.
+def policy_rows(response, rule):
+    rows = []
+    for product in response.products:
+        price = lambda week: response.index(product, week)
+        if rule['kind'] == 'static':
+            rows += [(price(rule['weeks'][0]), price(w), '=', 0.0) for w in rule['weeks'][1:]]
+        elif rule['kind'] == 'below':
+            rows += [(price(r), price(w), '>', 1.0) for w in rule['weeks'] for r in rule['reference']]
+        elif rule['kind'] == 'above':
+            rows += [(price(w), price(r), '>', 1.0) for w in rule['weeks'] for r in rule['reference']]
+        elif rule['kind'] == 'between':
+            rows += [(price(w), price(l), '>', 0.0) for w in rule['weeks'] for l in rule['lower']]
+            rows += [(price(u), price(w), '>', 0.0) for w in rule['weeks'] for u in rule['upper']]
+        else:
+            raise ValueError("Unknown policy rule '%s'" % rule['kind'])
+    return rows
+
+# The price policy of Table 1 over the given weeks ([1..17]) as rules
+def table_1(weeks):
+    others = lambda *excluded: [w for w in weeks if w not in excluded]
+    return [
+        {'name': "1-4 static",      'kind': 'static',  'weeks': [1, 2, 3, 4]},
+        {'name': "5-8 static",      'kind': 'static',  'weeks': [5, 6, 7, 8]},
+        {'name': "5-8 lower",       'kind': 'below',   'weeks': [5, 6, 7, 8],  'reference': [1, 2, 3, 4], 'amount': 10},
+        {'name': "9-11 static",     'kind': 'static',  'weeks': [9, 10, 11]},
+        {'name': "9-11 higher",     'kind': 'above',   'weeks': [9, 10, 11],   'reference': [1, 2, 3, 4], 'amount': 20},
+        {'name': "12 lowest",       'kind': 'below',   'weeks': [12],          'reference': others(12),   'amount': 5},
+        {'name': "13-15 static",    'kind': 'static',  'weeks': [13, 14, 15]},
+        {'name': "13-15 between",   'kind': 'between', 'weeks': [13, 14, 15],  'lower': [5, 6, 7, 8], 'upper': [1, 2, 3, 4]},
+        {'name': "16 above 12",     'kind': 'above',   'weeks': [16],          'reference': [12],         'amount': 4},
+        {'name': "16 below others", 'kind': 'below',   'weeks': [16],          'reference': others(12, 16), 'amount': 6},
+        {'name': "17 highest",      'kind': 'above',   'weeks': [17],          'reference': others(17),   'amount': 15},
+    ]
+
+# The pricing QP with every rule of a policy, built once. A scenario switches
+# rules off (sense >= with an infinite right-hand side) or changes their
+# amounts (right-hand side updates), so the model is never rebuilt and each
+# solve starts from the basis of the previous one (simplex warm start).
+class PricingEngine:
+
+    def __init__(self, response, rules):
+        self.response = response
+        self.rules = {rule['name']: rule for rule in rules}
+        self.model, self.p = build_pricing_model(response, "Pricing Policies")
+        self.model.setParam('OutputFlag', 0)
+
+        # Dual simplex re-optimizes from the previous basis after RHS changes
+        self.model.setParam('Method', 1)
+
+        # The constraints of every rule with their senses and right-hand side scales
+        self.constraints = {}
+        variables = self.p.tolist()
+        for name, rule in self.rules.items():
+            rows = policy_rows(response, rule)
+            amount = rule.get('amount', 0.0)
+            constrs = []
+            for i, j, sense, scale in rows:
+                expression = variables[i] - variables[j]
+                if sense == '=':
+                    constrs.append(self.model.addConstr(expression == scale*amount, name))
+                else:
+                    constrs.append(self.model.addConstr(expression >= scale*amount, name))
+            self.constraints[name] = (constrs, [sense for _, _, sense, _ in rows], np.array([scale for _, _, _, scale in rows]))
+        self.model.update()
+
+    # A scenario maps rule names to False (the rule is off), True (on with its
+    # own amount) or a number (on with this amount). Rules that are not
+    # mentioned are on.
+    def set_policy(self, scenario):
+        for name, (constrs, senses, scales) in self.constraints.items():
+            setting = scenario.get(name, True)
+            if setting is False:
+                self.model.setAttr('Sense', constrs, ['>']*len(constrs))
+                self.model.setAttr('RHS', constrs, [-GRB.INFINITY]*len(constrs))
+            else:
+                amount = self.rules[name].get('amount', 0.0) if setting is True else float(setting)
+                self.model.setAttr('Sense', constrs, senses)
+                self.model.setAttr('RHS', constrs, (scales*amount).tolist())
+
+    # Solve the QP for a scenario; returns the status, revenue and prices
+    def solve(self, scenario):
+        self.set_policy(scenario)
+        self.model.optimize()
+        if self.model.status != GRB.OPTIMAL:
+            return self.model.status, np.nan, np.full(len(self.response.a), np.nan)
+        return self.model.status, self.model.objVal, self.p.X
+
+# Every worker process builds the engine once and keeps it between tasks
+_engine = None
+
+def init_policy_worker(response, rules):
+    global _engine
+    _engine = PricingEngine(response, rules)
+
+def solve_policies(scenarios):
+    return [_engine.solve(scenario) for scenario in scenarios]
+
+# Evaluate many scenarios of a policy. The scenarios are split into
+# contiguous shards, one per worker, and each worker solves its shard in
+# order on its own engine. Returns (status, revenue, prices) per scenario.
+def sweep_policies(response, rules, scenarios, workers=4):
+    if workers <= 1 or len(scenarios) <= 1:
+        init_policy_worker(response, rules)
+        return solve_policies(scenarios)
+
+    shards = [list(shard) for shard in np.array_split(np.array(scenarios, dtype=object), workers) if len(shard) > 0]
+    with ProcessPoolExecutor(max_workers=len(shards), initializer=init_policy_worker, initargs=(response, rules)) as pool:
+        return [result for shard in pool.map(solve_policies, shards) for result in shard]
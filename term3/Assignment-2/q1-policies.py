@@ -0,0 +1,40 @@
+import pandas as pd
+from pricing import PriceResponse, sweep_policies, table_1
+
+# The number of worker processes that solve scenarios in parallel
+WORKERS = 4
+
+# The full Table 1, Table 1 without each rule, and a grid of offsets for
+# the "$10 lower" and "$20 higher" rules
+def policy_scenarios(rules):
+    scenarios = {"Table 1": {}}
+    for rule in rules:
+        scenarios["without " + rule['name']] = {rule['name']: False}
+    for lower in [0, 5, 10, 15, 20]:
+        for higher in [10, 20, 30, 40]:
+            scenarios[f"lower ${lower}, higher ${higher}"] = {"5-8 lower": lower, "9-11 higher": higher}
+    scenarios["no policy"] = {rule['name']: False for rule in rules}
+    return scenarios
+
+if __name__ == "__main__":
+    # =========== 1) Load Data ===========
+    url = "https://raw.githubusercontent.com/EthanRosehart/schulich_data_science/refs/heads/main/term3/Assignment-2/price_response.csv"
+    df = pd.read_csv(url)
+    response = PriceResponse(df)
+
+    # =========== 2) Table 1 as a declarative policy ===========
+    TABLE_1 = table_1(response.weeks)
+
+    # =========== 3) Scenarios ===========
+    scenarios = policy_scenarios(TABLE_1)
+
+    # =========== 4) Solve all scenarios on the same model ===========
+    results = sweep_policies(response, TABLE_1, list(scenarios.values()), workers=WORKERS)
+
+    summary = pd.DataFrame({
+        'Scenario': list(scenarios.keys()),
+        'Revenue': [revenue for _, revenue, _ in results],
+        'Change vs Table 1': [revenue - results[0][1] for _, revenue, _ in results],
+    })
+    pd.set_option('display.width', 120)
+    print(summary.sort_values('Revenue', ascending=False).to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
@@ -4,6 +4,36 @@
 
 from gurobipy import GRB
 import gurobipy as gb
+from scipy.cluster.vq import kmeans2
+import pandas as pd
+import numpy as np
+
+# Should we solve the model with a large set of joint demand scenarios?
+LARGE_SCENARIOS = True
+
+# A CSV file of joint demand scenarios with Frozen, Refrigerated and Regular
+# columns (and optionally a Probability column). If there is no file, the
+# scenarios are sampled around the seven hand-picked scenarios below.
+SCENARIO_FILE = None
+
+# The scenario counts used to check how the solution converges. Every
+# scenario adds three variables and three constraints, so the default counts
+# fit a size-limited Gurobi license; larger counts such as
+# [1000, 10000, 100000, 1000000] need a full license.
+SCENARIO_COUNTS = [100, 250, 500]
+
+# Also solve a reduced set of this many scenarios ('kmeans', 'fast-forward' or None)
+# and compare it with the solution over all the scenarios
+REDUCTION = 'kmeans'
+REDUCED_SCENARIOS = 50
+
+# Fast-forward selection needs a matrix of distances between all pairs of
+# scenarios, so larger sets are first reduced to this many with k-means
+FAST_FORWARD_LIMIT = 250
+
+# Revenue per ton and tons of capacity used by each class (frozen, refrigerated, regular)
+revenue = np.array([4, 3, 1])
+space = np.array([2, 1.5, 1])
 
 # Problem parameters
 p = [0.05, 0.15, 0.10, 0.25, 0.30, 0.10, 0.05]
@@ -53,4 +83,116 @@ print("Model Status: ", model.status)
 print("Objective :", model.objVal)
 
 # Capacity to assign
-print("(Frozen, Refrigerated, Regular): ", (x[0].x, x[1].x, x[2].x))
\ No newline at end of file
+print("(Frozen, Refrigerated, Regular): ", (x[0].x, x[1].x, x[2].x))
+
+# Read the joint demand scenarios (one row per scenario) and their probabilities
+def load_scenarios(path):
+    data = pd.read_csv(path)
+    demand = data[["Frozen", "Refrigerated", "Regular"]].to_numpy(dtype=float)
+    if "Probability" in data:
+        probability = data["Probability"].to_numpy(dtype=float)
+    else:
+        probability = np.full(len(demand), 1.0/len(demand))
+    return demand, probability/probability.sum()
+
+# Sample joint demand scenarios by picking one of the seven hand-picked
+# scenarios and perturbing it with normal noise (a smoothed empirical distribution)
+def sample_scenarios(count, rng):
+    base = np.column_stack((frozen, refrigerated, regular)).astype(float)
+    demand = base[rng.choice(len(p), size=count, p=p)] + rng.normal(0, [2, 4, 5], size=(count, 3))
+    return np.maximum(demand, 0), np.full(count, 1.0/count)
+
+# Reduce the scenarios with k-means: the centroids become the scenarios and
+# they carry the probability of the scenarios assigned to them. The k-means++
+# start costs O(n k^2), so many centroids are started from random scenarios.
+def kmeans_reduction(demand, probability, k, seed=2025, minit='++'):
+    centroids, labels = kmeans2(demand, k, minit=minit, seed=seed)
+    weight = np.bincount(labels, weights=probability, minlength=k)
+    return centroids[weight > 0], weight[weight > 0]
+
+# Fast-forward selection (Heitsch and Romisch). The distance matrix is
+# quadratic in the number of scenarios, so more than FAST_FORWARD_LIMIT
+# scenarios are first reduced with k-means.
+def fast_forward_reduction(demand, probability, k):
+    if len(demand) > FAST_FORWARD_LIMIT:
+        demand, probability = kmeans_reduction(demand, probability, FAST_FORWARD_LIMIT, minit='points')
+    distance = np.sqrt(((demand[:, None, :] - demand[None, :, :])**2).sum(axis=2))
+    selected = []
+    for _ in range(k):
+        # The probability-weighted distance if scenario u were also kept
+        z = probability @ distance
+        z[selected] = np.inf
+        u = int(np.argmin(z))
+        selected.append(u)
+        distance = np.minimum(distance, distance[:, [u]])
+
+    # Move the probability of every removed scenario to its closest kept one
+    nearest = np.argmin(np.sqrt(((demand[:, None, :] - demand[None, selected, :])**2).sum(axis=2)), axis=1)
+    return demand[selected], np.bincount(nearest, weights=probability, minlength=k)
+
+# Build and solve the cargo model for any number of scenarios with the matrix
+# API. The demand enters as upper bounds on the recourse variables so the
+# only constraints are the capacity constraint and y <= x for each class.
+def solve_cargo_plane(demand, probability):
+    model = gb.Model("CargoPlane")
+    model.setParam('OutputFlag', 0)
+    x = model.addMVar(classes, lb=0, vtype=GRB.CONTINUOUS, name="Tons")
+    y = model.addMVar((classes, len(demand)), lb=0, ub=demand.T, vtype=GRB.CONTINUOUS, name="Recourse")
+    model.setObjective((10*np.outer(revenue, probability)*y).sum(), GRB.MAXIMIZE)
+    model.addConstr(space @ x <= 102, "Capacity")
+    model.addConstr(y <= x[:, None], "Class Capacity")
+    model.optimize()
+    objective, tons = model.objVal, x.X
+    model.dispose()
+    return objective, tons
+
+# The expected revenue of a first-stage decision over a set of scenarios:
+# given the tons of each class, the best recourse is y = min(tons, demand)
+def evaluate_cargo_plane(tons, demand, probability):
+    return 10*probability @ (np.minimum(tons, demand) @ revenue)
+
+# Did you want to solve the model with a large set of joint demand scenarios?
+if LARGE_SCENARIOS:
+
+    # Check that the matrix builder reproduces the seven scenario model
+    objective, tons = solve_cargo_plane(np.column_stack((frozen, refrigerated, regular)).astype(float), np.array(p))
+    print("Matrix Builder Objective (7 scenarios): ", objective)
+
+    rng = np.random.default_rng(2025)
+    if SCENARIO_FILE is not None:
+        history, history_probability = load_scenarios(SCENARIO_FILE)
+
+    # How do the objective and the first-stage decisions change as scenarios are
+    # added? Every set is solved in full; with a reduction, the reduced model is
+    # solved too and its decision is evaluated on all the scenarios.
+    print("%10s %12s %28s %10s %12s %12s" % ("Scenarios", "Objective", "(Frozen, Refrigerated, Regular)",
+                                             "Reduced", "Reduced Obj", "Evaluated"))
+    for count in SCENARIO_COUNTS:
+        if SCENARIO_FILE is not None:
+            if count > len(history):
+                break
+            rows = rng.choice(len(history), size=count, replace=False)
+            demand, probability = history[rows], history_probability[rows]/history_probability[rows].sum()
+        else:
+            demand, probability = sample_scenarios(count, rng)
+
+        # A set that is too large for the license is reported and skipped;
+        # its reduced model is still solved and evaluated on all the scenarios
+        error = None
+        try:
+            objective, tons = solve_cargo_plane(demand, probability)
+            row = "%10d %12.2f %28s" % (count, objective, "(%.2f, %.2f, %.2f)" % tuple(tons))
+        except gb.GurobiError as exception:
+            error = exception
+            row = "%10d %12s %28s" % (count, "-", "-")
+
+        if REDUCTION is not None and count > REDUCED_SCENARIOS:
+            if REDUCTION == 'kmeans':
+                reduced, reduced_probability = kmeans_reduction(demand, probability, REDUCED_SCENARIOS)
+            else:
+                reduced, reduced_probability = fast_forward_reduction(demand, probability, REDUCED_SCENARIOS)
+            reduced_objective, reduced_tons = solve_cargo_plane(reduced, reduced_probability)
+            row += " %10d %12.2f %12.2f" % (len(reduced), reduced_objective, evaluate_cargo_plane(reduced_tons, demand, probability))
+        print(row)
+        if error is not None:
+            print("%10s Gurobi error for %d scenarios: %s" % ("", count, error))
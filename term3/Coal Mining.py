@@ -4,6 +4,56 @@
 
 from gurobipy import GRB
 import gurobipy as gb
+import numpy as np
+import scipy.stats as sp
+
+# Should we also solve a finely discretized version with the 1-D breakpoint search?
+BREAKPOINT_SEARCH = True
+
+# The number of points used to discretize the demand and mining rate distributions
+# (the scenario grid has DEMAND_POINTS * MINING_POINTS = 100,000 points)
+DEMAND_POINTS = 500
+MINING_POINTS = 200
+
+# Cost parameters
+hourly_cost = 8800      # Cost per hour of mining
+energy_price = 2000     # Cost of purchasing energy (per unit of shortfall)
+
+# The expected cost of mining x hours when the (demand, mining rate) scenarios
+# occur with the given weights. The recourse y = max(0, demand - rate*x) is
+# known in closed form so no variables are needed. x may be a vector.
+def expected_cost(x, demand, rate, weight):
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    cost = np.empty(len(x))
+    for k in range(len(x)):
+        cost[k] = hourly_cost*x[k] + energy_price*(weight @ np.maximum(demand - rate*x[k], 0.0))
+    return cost
+
+# The expected cost is piecewise linear and convex in x with breakpoints at
+# demand/rate. Its right derivative after a breakpoint is
+#   hourly_cost - energy_price * sum(weight*rate over scenarios not yet covered)
+# so the optimum is the first breakpoint where this slope becomes nonnegative.
+def breakpoint_search(demand, rate, weight, lb=0.0, ub=24.0):
+    positive = rate > 0
+    breakpoints = demand[positive]/rate[positive]
+    order = np.argsort(breakpoints)
+    breakpoints = breakpoints[order]
+    weighted_rate = (weight[positive]*rate[positive])[order]
+
+    # The slope of the expected cost immediately to the right of each breakpoint
+    uncovered = np.append(np.cumsum(weighted_rate[::-1])[::-1][1:], 0.0)
+    slopes = hourly_cost - energy_price*uncovered
+
+    # The slope before the first breakpoint is nonnegative: don't mine at all
+    if hourly_cost - energy_price*weighted_rate.sum() >= 0:
+        return lb
+    k = np.searchsorted(slopes, 0.0, side='left')
+    return float(np.clip(breakpoints[k], lb, ub))
+
+# Discretize a continuous distribution into equally likely points at the
+# midpoints of its quantile intervals
+def discretize(distribution, points):
+    return distribution.ppf((np.arange(points) + 0.5)/points)
 
 # Create a new optimization model
 model = gb.Model("Coal Mining")
@@ -21,23 +71,46 @@ x = model.addVar(lb=0, ub=24, vtype=GRB.CONTINUOUS, name="Mining Hours")
 y = model.addVars(demand_scenarios, mining_scenarios, lb=0, vtype=GRB.CONTINUOUS, name="Recourse")
 
 #First-stage (Cost for total number of hours for first-stage)
-first_stage = 8800*x
+first_stage = hourly_cost*x
 
 #Second-stage (cost of purchasing energy)
 second_stage = gb.quicksum(y[i,j] for i in range(demand_scenarios) for j in range(mining_scenarios))
 
 #Objective Function to minimize expected costs
-model.setObjective(first_stage + 2000.0/30.0 * second_stage, GRB.MINIMIZE)
+model.setObjective(first_stage + energy_price/30.0 * second_stage, GRB.MINIMIZE)
 
-#Second-stage constraints 
+#Second-stage constraints
 model.addConstrs((mine[j]*x + y[i,j] >= demand[i] for i in range(demand_scenarios) for j in range(mining_scenarios)), "Demand Satisfaction")
 
 #Solve our model
-model.optimize()   
+model.optimize()
 
 # The contirbution of each source of costs
 print("Fixed Costs: ", first_stage.getValue())
 print("Energy Costs: ", second_stage.getValue())
 
 # Value of the first-stage variable
-print("Mining Hours per Day: ", x.x)
\ No newline at end of file
+print("Mining Hours per Day: ", x.x)
+
+# Did you want to solve the problem with the 1-D breakpoint search?
+if BREAKPOINT_SEARCH:
+
+    # Cross-check the breakpoint search against the LP on the original 5x6 grid
+    D, M = np.meshgrid(demand, mine, indexing='ij')
+    W = np.full(D.size, 1.0/D.size)
+    x_search = breakpoint_search(D.ravel().astype(float), M.ravel().astype(float), W)
+    print("Breakpoint Search Mining Hours per Day: ", x_search)
+    print("Breakpoint Search Expected Cost: ", expected_cost(x_search, D.ravel(), M.ravel(), W)[0])
+    print("LP Expected Cost: ", model.objVal)
+
+    # Continuous versions of the scenarios: demand is uniform on [75.5, 130.5]
+    # and the mining rate is uniform on [2.5, 32.5] (the discrete values above
+    # are the midpoints of equally wide intervals)
+    fine_demand = discretize(sp.uniform(75.5, 55), DEMAND_POINTS)
+    fine_mine = discretize(sp.uniform(2.5, 30), MINING_POINTS)
+    D, M = np.meshgrid(fine_demand, fine_mine, indexing='ij')
+    W = np.full(D.size, 1.0/D.size)
+    x_fine = breakpoint_search(D.ravel(), M.ravel(), W)
+    print("Scenario Grid Size: ", D.size)
+    print("Fine Grid Mining Hours per Day: ", x_fine)
+    print("Fine Grid Expected Cost: ", expected_cost(x_fine, D.ravel(), M.ravel(), W)[0])
@@ -2,11 +2,17 @@
 @author: Adam Diamant (2025)
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from gurobipy import GRB
 import gurobipy as gb
+import numpy as np
 
-# The optimal solutions
-optimal_solutions = []
+# Should we also evaluate a large set of sampled yield scenarios?
+SAMPLED_SCENARIOS = True
+
+# The number of sampled scenarios and worker processes (1 = solve in this process)
+SAMPLES = 5000
+WORKERS = 4
 
 # The parameters
 oat_yield = [4.25, 5.1, 3.4]
@@ -22,44 +28,95 @@ SOLD = 4
 sell = [220, 260, 55, 26]
 purchase = [264, 312]
 
-for k in range(3):
+# Build the farming problem once. Only the three yield coefficients change
+# between scenarios so we keep a handle on the constraints that contain them.
+def build_farming_model(yields):
 
     # Create a new optimization model to maximize profit
     model = gb.Model("Farming Problem")
-    
+    model.setParam('OutputFlag', 0)
+
+    # Turning presolve off lets the simplex method restart directly from the
+    # basis of the previous scenario after the coefficients are changed
+    model.setParam('Presolve', 0)
+
     # Construct the decision variables.
     x = model.addVars(3, lb=0, vtype=GRB.CONTINUOUS, name="Crops")
     y = model.addVars(2, lb=0, vtype=GRB.CONTINUOUS, name="Purchased")
     z = model.addVars(4, lb=0, vtype=GRB.CONTINUOUS, name="Sold")
-    
+
     # Objective Function
     model.setObjective(gb.quicksum(z[i]*sell[i] for i in range(SOLD)) - gb.quicksum(y[i]*purchase[i] for i in range(PURCHASED)), GRB.MAXIMIZE)
-    
-    # Land capacity constraints 
+
+    # Land capacity constraints
     model.addConstr(x[0] + x[1] + x[2] <= 500, "Land Capacity")
-    
+
     # Cattle feed constraints (oats)
-    model.addConstr(oat_yield[k]*x[0] + y[0] - z[0] >= 200, "Oats")
-    
+    oats = model.addConstr(yields[0]*x[0] + y[0] - z[0] >= 200, "Oats")
+
     # Cattle feed constraints (Maize)
-    model.addConstr(maize_yield[k]*x[1] + y[1] - z[1] >= 260, "Oats")
-    
+    maize = model.addConstr(yields[1]*x[1] + y[1] - z[1] >= 260, "Maize")
+
     # Quota constraints (Soybean)
     model.addConstr(z[2] <= 7000, "Quota")
-    model.addConstr(z[2] + z[3] == soybean_yield[k]*x[2], "Soybean")
-    
-    # Solve our model
-    model.optimize()
-    
-    # Append the objective function value
-    optimal_solutions.append(model.objVal)
-    
-# The Average objective function value
-print(optimal_solutions)
-
-# Analyze EVPI 
-sp = 369949.33
-ws = 0.45 * optimal_solutions[0] + 0.25 * optimal_solutions[1] + 0.3 * optimal_solutions[2]
-print("SP Objective Function Value:",  sp)
-print("WS Objective Function Value:", ws)
-print("EVPI = WS - SP = ", ws - sp)
+    soybean = model.addConstr(z[2] + z[3] - yields[2]*x[2] == 0, "Soybean")
+
+    return model, x, (oats, maize, soybean)
+
+# Solve the wait-and-see problem for each row of (oat, maize, soybean) yields.
+# The model is built once and each scenario only updates three coefficients.
+def wait_and_see(yield_scenarios):
+
+    yield_scenarios = np.asarray(yield_scenarios, dtype=float)
+    model, x, (oats, maize, soybean) = build_farming_model(yield_scenarios[0])
+
+    # The optimal objective value in every scenario
+    objectives = np.empty(len(yield_scenarios))
+    for k, (oat, corn, soy) in enumerate(yield_scenarios):
+        model.chgCoeff(oats, x[0], oat)
+        model.chgCoeff(maize, x[1], corn)
+        model.chgCoeff(soybean, x[2], -soy)
+        model.optimize()
+        objectives[k] = model.objVal
+
+    model.dispose()
+    return objectives
+
+# Shard the scenarios across worker processes; each worker builds its own model
+def parallel_wait_and_see(yield_scenarios, workers=WORKERS):
+
+    if workers <= 1 or len(yield_scenarios) <= workers:
+        return wait_and_see(yield_scenarios)
+
+    shards = np.array_split(np.asarray(yield_scenarios, dtype=float), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(wait_and_see, shards)))
+
+
+if __name__ == "__main__":
+
+    # The optimal solutions
+    optimal_solutions = wait_and_see(np.column_stack((oat_yield, maize_yield, soybean_yield)))
+
+    # The Average objective function value
+    print(optimal_solutions.tolist())
+
+    # Analyze EVPI
+    sp = 369949.33
+    ws = 0.45 * optimal_solutions[0] + 0.25 * optimal_solutions[1] + 0.3 * optimal_solutions[2]
+    print("SP Objective Function Value:",  sp)
+    print("WS Objective Function Value:", ws)
+    print("EVPI = WS - SP = ", ws - sp)
+
+    # Did you want to evaluate a large number of sampled yield scenarios?
+    if SAMPLED_SCENARIOS:
+
+        # Each crop's yield varies independently between the pessimistic (-20%)
+        # and optimistic (+20%) outcomes around the average yield
+        rng = np.random.default_rng(2025)
+        multipliers = rng.uniform(0.8, 1.2, size=(SAMPLES, CROPS))
+        yields = multipliers * np.array([oat_yield[0], maize_yield[0], soybean_yield[0]])
+
+        sampled = parallel_wait_and_see(yields)
+        standardError = sampled.std(ddof=1)/np.sqrt(SAMPLES)
+        print("Sampled WS Objective Function Value: %.2f (SE %.2f)" % (sampled.mean(), standardError))
@@ -4,14 +4,50 @@
 
 from gurobipy import GRB
 import gurobipy as gb
+import numpy as np
 import scipy.stats as sp
 
+# Should we also compute the order quantity from the critical ratio?
+CRITICAL_RATIO = True
+
 # Problem parameters
 c = 10.0 # cost of procurement
 b = 60.0 # lost demand
 h = 25.0 # wastage
 m = 5.0  # wood per doll
 
+# The expected cost of procuring x pounds of wood. The demand is either a
+# (frozen) scipy distribution or an array of empirical demand samples.
+def expected_cost(x, distribution=None, samples=None):
+    q = x/m
+    if samples is not None:
+        samples = np.asarray(samples, dtype=float)
+        return c*x + np.mean(b*np.maximum(samples - q, 0) + h*np.maximum(q - samples, 0))
+
+    # Expected excess E[(q - D)+] from the vectorized pmf (or by integration),
+    # then the expected shortage from E[(D - q)+] = E[(q - D)+] + E[D] - q
+    if isinstance(distribution.dist, sp.rv_discrete):
+        n = np.arange(distribution.ppf(1e-12), np.floor(q) + 1)
+        excess = np.sum((q - n)*distribution.pmf(n))
+    else:
+        excess = distribution.expect(lambda d: q - d, ub=q)
+    shortage = excess + distribution.mean() - q
+    return c*x + b*shortage + h*excess
+
+# The cost is convex in the number of dolls q = x/m, with derivative
+#   c*m - b*P(D > q) + h*P(D <= q)
+# so the optimal q is the smallest value where the CDF reaches the critical
+# ratio (b - c*m)/(b + h). Both ppf and the inverted empirical CDF return it.
+def critical_ratio_solution(distribution=None, samples=None, ub=1000):
+    ratio = (b - c*m)/(b + h)
+    if ratio <= 0:
+        return 0.0
+    if samples is not None:
+        q = np.quantile(np.asarray(samples, dtype=float), ratio, method='inverted_cdf')
+    else:
+        q = distribution.ppf(ratio)
+    return float(min(m*q, ub))
+
 # Create a new optimization model to minimize cost
 model = gb.Model("Making Dolls")
 
@@ -24,7 +60,8 @@ y = model.addVars(161, lb=0, vtype=GRB.CONTINUOUS, name="Scenario costs")
 #Objective Function = ordering cost + expected future cost for each scenario
 #Note that sp.binom.pmf(n,160,0.43) generates the probability of see a demand value of n
 #For more information about this function, see: https://docs.scipy.org/doc/scipy-0.14.0/reference/generated/scipy.stats.binom.html
-model.setObjective(c*x + gb.quicksum(sp.binom.pmf(n,160,0.43)*y[n] for n in range(161)), GRB.MINIMIZE)
+pmf = sp.binom.pmf(np.arange(161),160,0.43)
+model.setObjective(c*x + gb.quicksum(pmf[n]*y[n] for n in range(161)), GRB.MINIMIZE)
 
 #Storage constraint 
 # model.addConstr(x <= 1000, "Storage")
@@ -49,4 +86,24 @@ print("Model Status: ", model.status)
 print("Objective :", model.objVal)
 
 # Pounds of wood to procure
-print("Wood (lbs) to Procure: ", x.x)
\ No newline at end of file
+print("Wood (lbs) to Procure: ", x.x)
+
+# Did you want to compute the order quantity from the critical ratio?
+if CRITICAL_RATIO:
+
+    # Validate against the LP using the same Binomial(160, 0.43) demand
+    demand = sp.binom(160, 0.43)
+    wood = critical_ratio_solution(demand)
+    print("Critical Ratio Wood (lbs) to Procure: ", wood)
+    print("Critical Ratio Objective: ", expected_cost(wood, demand))
+
+    # The same model with demand from empirical samples
+    samples = demand.rvs(size=100000, random_state=2025)
+    wood = critical_ratio_solution(samples=samples)
+    print("Empirical Wood (lbs) to Procure: ", wood)
+    print("Empirical Objective: ", expected_cost(wood, samples=samples))
+
+    # Large demand ranges that would need hundreds of thousands of constraints in the LP
+    for name, demand in [("Poisson(50000)", sp.poisson(50000)), ("NegBin(20, 0.0004)", sp.nbinom(20, 0.0004))]:
+        wood = critical_ratio_solution(demand, ub=np.inf)
+        print(name, "Wood (lbs) to Procure: ", wood, " Objective: ", expected_cost(wood, demand))
@@ -4,6 +4,61 @@
 
 import random
 import math
+import numpy as np
+from functools import partial
+from montecarlo import randomized_qmc, critical_values, parallel_monte_carlo, RunningStatistics
+
+# Should we use the vectorized pricer? The trials are processed in chunks of
+# CHUNK so that memory stays bounded for any number of trials (a power of 2
+# keeps the Sobol points balanced).
+VECTORIZED = True
+CHUNK = 2**16
+
+# Variance reduction for the vectorized pricer: pair every normal draw with
+# its negative, and/or use the discounted terminal price (whose expectation
+# is the current price S) as a control variate
+ANTITHETIC = True
+CONTROL_VARIATE = True
+
+# Which draws should the vectorized pricer use? 'random' is pseudo-random;
+# 'sobol' and 'halton' are scrambled low-discrepancy sequences, run as
+# REPLICATES independent replicates of QMC_POINTS trials
+SAMPLER = 'random'
+REPLICATES = 16
+QMC_POINTS = 2**16
+
+# Should the vectorized pricer run on WORKERS processes? Batches of BATCH
+# samples are simulated until the 95% confidence interval half-width drops
+# below PRECISION dollars (or MAX_TRIALS samples have been run).
+PARALLEL = False
+WORKERS = 4
+BATCH = 2**18
+PRECISION = 1.0
+MAX_TRIALS = 10**8
+
+# Should we also price path-dependent policies on a basket of correlated
+# assets? The basket is monitored at STEPS dates and the paths are simulated
+# PATH_CHUNK at a time, so only a PATH_CHUNK x STEPS x assets block is ever
+# held in memory (about 16MB for two assets).
+PATH_DEPENDENT = False
+STEPS = 252
+PATHS = 10**6
+PATH_CHUNK = 2**12
+
+# The assets in the basket (more assets, e.g. a rate index with a zero
+# weight, are added as extra rows), their volatilities and correlations
+ASSETS = ['House', 'Renovation']
+S0 = [1200000, 200000]
+VOLS = [0.05, 0.10]
+WEIGHTS = [1.0, 1.0]
+CORRELATION = [[1.0, 0.6],
+               [0.6, 1.0]]
+
+# The knock-in/knock-out level of the basket for the barrier puts
+BARRIER = 1300000
+
+# The path-dependent payoffs that are priced together
+PAYOFFS = ['European', 'Asian', 'Down-and-in', 'Down-and-out']
 
 # Calculate the price of the house for a given set of parameters
 def geometric_brownian_motion(S,v,r,T):
@@ -12,35 +67,187 @@ def geometric_brownian_motion(S,v,r,T):
 # Calculate the payoff of the European-style put option at maturity
 def put_option_payoff(S_T,K):
     return max(K-S_T,0.0)
+
+# The standard normal CDF
+def normal_cdf(x):
+    return 0.5*(1.0 + math.erf(x/math.sqrt(2.0)))
+
+# The closed-form Black-Scholes price of the European put
+def black_scholes_put(S,v,r,T,K):
+    d1 = (math.log(S/K) + (r + 0.5*v**2)*T)/(v*math.sqrt(T))
+    d2 = d1 - v*math.sqrt(T)
+    return K*math.exp(-r*T)*normal_cdf(-d2) - S*normal_cdf(-d1)
+
+# The discounted payoff (y) and discounted terminal price (x) for the normals
+# Z. With antithetic variates each sample is the average over Z and -Z.
+def discounted_samples(Z,S,v,r,T,K,antithetic=ANTITHETIC):
+    if antithetic:
+        Z = np.concatenate((Z, -Z))
+    S_T = S*np.exp((r - 0.5*v**2)*T + v*math.sqrt(T)*Z)
+    y = math.exp(-r*T)*np.maximum(K - S_T, 0.0)
+    x = math.exp(-r*T)*S_T
+    if antithetic:
+        half = len(Z)//2
+        y = 0.5*(y[:half] + y[half:])
+        x = 0.5*(x[:half] + x[half:])
+    return y, x
+
+# The control variate samples y - b*(x - S) for the parallel runner (see
+# montecarlo.py). The coefficient b is fixed in advance, e.g. from a pilot
+# run, so that the mean of the samples stays an unbiased price.
+def put_samples(rng,trials,S,v,r,T,K,b=0.0,antithetic=ANTITHETIC):
+    y, x = discounted_samples(rng.standard_normal(trials),S,v,r,T,K,antithetic)
+    return y - b*(x - S)
+
+# The control variate coefficient Cov(y, x)/Var(x) estimated from a pilot run
+def control_coefficient(S,v,r,T,K,pilot=10000,antithetic=ANTITHETIC,rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    y, x = discounted_samples(rng.standard_normal(pilot),S,v,r,T,K,antithetic)
+    return np.cov(x, y)[0, 1]/x.var(ddof=1)
+
+# The discounted put payoffs (one column per entry of PAYOFFS) of `paths`
+# correlated GBM paths. The log increments of every asset at every step are
+# drawn as one paths x steps x assets block, correlated with the Cholesky
+# factor of the correlation matrix and accumulated along the steps. The
+# basket is the weighted sum of the asset prices on every monitoring date:
+# the Asian put uses its average and the barrier puts its minimum.
+def simulate_path_payoffs(rng,paths,S0,vols,correlation,weights,r,T,K,barrier,steps=STEPS):
+    S0 = np.asarray(S0, dtype=float)
+    vols = np.asarray(vols, dtype=float)
+    cholesky = np.linalg.cholesky(np.asarray(correlation, dtype=float))
+    dt = T/steps
+
+    # The asset prices relative to S0 on every monitoring date
+    paths_block = rng.standard_normal((paths, steps, len(S0))) @ cholesky.T
+    paths_block *= vols*math.sqrt(dt)
+    paths_block += (r - 0.5*vols**2)*dt
+    np.cumsum(paths_block, axis=1, out=paths_block)
+    np.exp(paths_block, out=paths_block)
+    basket = paths_block @ (S0*np.asarray(weights, dtype=float))
+
+    discount = math.exp(-r*T)
+    european = discount*np.maximum(K - basket[:, -1], 0.0)
+    asian = discount*np.maximum(K - basket.mean(axis=1), 0.0)
+    knocked_in = basket.min(axis=1) <= barrier
+    return np.column_stack((european, asian, european*knocked_in, european*~knocked_in))
+
+# Price the path-dependent puts chunk by chunk with running statistics.
+# Returns the RunningStatistics of the discounted payoffs (one column per payoff).
+def price_path_dependent(S0,vols,correlation,weights,r,T,K,barrier,paths=PATHS,steps=STEPS,chunk=PATH_CHUNK,rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    statistics = RunningStatistics()
+    for start in range(0, paths, chunk):
+        size = min(chunk, paths - start)
+        statistics.update(simulate_path_payoffs(rng,size,S0,vols,correlation,weights,r,T,K,barrier,steps))
+    return statistics
+
+# Price the put with NumPy. Each chunk draws its normals at once and applies
+# the GBM and the payoff to the whole array. With antithetic variates one
+# sample is the average over Z and -Z (so TRIALS normals make TRIALS/2
+# samples). With the control variate the estimate is corrected by
+# b*(mean discounted S_T - S), where b is the regression coefficient of the
+# payoff on the control. Returns the price, standard deviation and standard error.
+# If a sampler is given (see montecarlo.py), the normals come from it instead of rng.
+def price_put_vectorized(S,v,r,T,K,trials,chunk=CHUNK,antithetic=ANTITHETIC,control_variate=CONTROL_VARIATE,rng=None,sampler=None):
+
+    rng = np.random.default_rng() if rng is None else rng
+    samples = trials//2 if antithetic else trials
+
+    # Running sums of the samples (y), the control (x), their squares and product
+    sum_y = sum_x = sum_yy = sum_xx = sum_xy = 0.0
+    for start in range(0, samples, chunk):
+        size = min(chunk, samples - start)
+        Z = rng.standard_normal(size) if sampler is None else sampler.normal(size)[:, 0]
+        y, x = discounted_samples(Z,S,v,r,T,K,antithetic)
+        sum_y += y.sum()
+        sum_x += x.sum()
+        sum_yy += y @ y
+        sum_xx += x @ x
+        sum_xy += x @ y
+
+    averagePrice = sum_y/samples
+    variance = (sum_yy - samples*averagePrice**2)/(samples - 1)
+    if control_variate:
+        mean_x = sum_x/samples
+        variance_x = (sum_xx - samples*mean_x**2)/(samples - 1)
+        covariance = (sum_xy - samples*mean_x*averagePrice)/(samples - 1)
+        b = covariance/variance_x
+        averagePrice -= b*(mean_x - S)
+        variance -= covariance**2/variance_x
+
+    standardDeviation = math.sqrt(max(variance, 0.0))
+    return averagePrice, standardDeviation, standardDeviation/math.sqrt(samples)
   
-S = 1400000  # the current price of the house + renovation input
-v = 0.05     # the annualised standard deviation of the assets returns
-r = 0.027    # the risk free interest rate
-T = 1.0      # the time to maturity 
-K = 1500000  # the strike price
-
-# The number of trials to perform
-TRIALS = 1000000
-totalPrice = 0
-totalPriceSquared = 0
-
-# The Monte Carlo simulation
-for trial in range(0,TRIALS):
-    S_T = geometric_brownian_motion(S,v,r,T)
-    optionPrice = math.exp(-r * T)*put_option_payoff(S_T, K)
-    totalPrice += optionPrice                                    # Add the option price to the summation
-    totalPriceSquared += optionPrice*optionPrice                 # Add the option price squared to the summation
-    
-# Calculate the average time over all trials and print the result 
-averagePrice = 1.0*totalPrice/TRIALS
-print("The average price of the option is $%2.2f." % averagePrice)    
-
-# Calculate the standard error over all trials and print the result 
-variance = 1.0/(TRIALS-1)*totalPriceSquared - 1.0*TRIALS/(TRIALS-1)*averagePrice*averagePrice
-standardDeviation = math.sqrt(variance)              
-standardError = math.sqrt(1.0*variance/TRIALS)
-print("The standard deviation is $%2.2f." % standardDeviation)
-print("The standard error is $%2.2f." % standardError)
-print("The 90%% confidence interval is (%2.2f, %2.2f)." % (averagePrice -  1.645*standardError , averagePrice + 1.645*standardError))
-print("The 95%% confidence interval is (%2.2f, %2.2f)." % (averagePrice -  1.96*standardError , averagePrice + 1.96*standardError))
-print("The 99%% confidence interval is (%2.2f, %2.2f)." % (averagePrice -  2.575*standardError , averagePrice + 2.575*standardError))
+if __name__ == "__main__":
+
+    S = 1400000  # the current price of the house + renovation input
+    v = 0.05     # the annualised standard deviation of the assets returns
+    r = 0.027    # the risk free interest rate
+    T = 1.0      # the time to maturity 
+    K = 1500000  # the strike price
+
+    # The number of trials to perform
+    TRIALS = 1000000
+
+    # Normal critical values, unless the standard error comes from RQMC replicates
+    z90, z95, z99 = critical_values()
+
+    if VECTORIZED and PARALLEL:
+
+        # Independent SeedSequence streams per batch, merged with streaming statistics
+        b = control_coefficient(S,v,r,T,K,rng=np.random.default_rng(2024)) if CONTROL_VARIATE else 0.0
+        statistics = parallel_monte_carlo(partial(put_samples,S=S,v=v,r=r,T=T,K=K,b=b), MAX_TRIALS, batch=BATCH,
+                                          workers=WORKERS, epsilon=PRECISION, seed=2025)
+        averagePrice, standardError = statistics.mean, statistics.standard_error()
+        standardDeviation = math.sqrt(statistics.variance())
+        print("The average price of the option is $%2.2f (%d samples)." % (averagePrice, statistics.count))
+        print("The Black-Scholes price of the option is $%2.2f." % black_scholes_put(S,v,r,T,K))
+
+    elif VECTORIZED and SAMPLER != 'random':
+
+        # Randomized QMC: the spread of the replicate prices gives the standard error
+        estimate = lambda sampler: price_put_vectorized(S,v,r,T,K,QMC_POINTS,sampler=sampler)[0]
+        averagePrice, standardError, replicates = randomized_qmc(estimate, SAMPLER, REPLICATES)
+        standardDeviation = replicates.std(ddof=1)
+        z90, z95, z99 = critical_values(REPLICATES - 1)
+        print("The average price of the option is $%2.2f." % averagePrice)
+        print("The Black-Scholes price of the option is $%2.2f." % black_scholes_put(S,v,r,T,K))
+
+    elif VECTORIZED:
+        averagePrice, standardDeviation, standardError = price_put_vectorized(S,v,r,T,K,TRIALS)
+        print("The average price of the option is $%2.2f." % averagePrice)
+        print("The Black-Scholes price of the option is $%2.2f." % black_scholes_put(S,v,r,T,K))
+
+    else:
+        totalPrice = 0
+        totalPriceSquared = 0
+
+        # The Monte Carlo simulation
+        for trial in range(0,TRIALS):
+            S_T = geometric_brownian_motion(S,v,r,T)
+            optionPrice = math.exp(-r * T)*put_option_payoff(S_T, K)
+            totalPrice += optionPrice                                    # Add the option price to the summation
+            totalPriceSquared += optionPrice*optionPrice                 # Add the option price squared to the summation
+
+        # Calculate the average time over all trials and print the result 
+        averagePrice = 1.0*totalPrice/TRIALS
+        print("The average price of the option is $%2.2f." % averagePrice)    
+
+        # Calculate the standard error over all trials
+        variance = 1.0/(TRIALS-1)*totalPriceSquared - 1.0*TRIALS/(TRIALS-1)*averagePrice*averagePrice
+        standardDeviation = math.sqrt(variance)              
+        standardError = math.sqrt(1.0*variance/TRIALS)
+
+    # Print the standard error and confidence intervals
+    print("The standard deviation is $%2.2f." % standardDeviation)
+    print("The standard error is $%2.2f." % standardError)
+    print("The 90%% confidence interval is (%2.2f, %2.2f)." % (averagePrice -  z90*standardError , averagePrice + z90*standardError))
+    print("The 95%% confidence interval is (%2.2f, %2.2f)." % (averagePrice -  z95*standardError , averagePrice + z95*standardError))
+    print("The 99%% confidence interval is (%2.2f, %2.2f)." % (averagePrice -  z99*standardError , averagePrice + z99*standardError))
+
+    # Did you want to price the path-dependent policies on the correlated basket?
+    if PATH_DEPENDENT:
+        statistics = price_path_dependent(S0,VOLS,CORRELATION,WEIGHTS,r,T,K,BARRIER)
+        print("\nPath-dependent puts on %s (%d paths, %d monitoring dates)" % (" + ".join(ASSETS), statistics.count, STEPS))
+        for name, price, error in zip(PAYOFFS, statistics.mean, statistics.standard_error()):
+            print("%s put: $%2.2f (95%% CI %2.2f to %2.2f)" % (name, price, price - 1.96*error, price + 1.96*error))
@@ -2,41 +2,291 @@
 @author: Adam Diamant (2025)
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from gurobipy import GRB
 import gurobipy as gb
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from scipy.sparse.csgraph import connected_components
+import time
+
+# Should we also solve the reformulation in prices only (d = a - b*p)?
+REFORMULATE = True
+
+# How is integer demand handled in the reformulation?
+#   'continuous'  demand may be fractional: a concave QP in the prices
+#   'repair'      the QP demands are rounded down and the markdowns repaired
+#   'piecewise'   integer demands with the exact piecewise-linear revenue
+INTEGER_DEMAND = 'piecewise'
+
+# Should we also run the table-driven engine on a synthetic catalogue of
+# SKUS products over PERIODS weeks? Every inventory pool is shared by
+# POOL_SIZE SKUs and the independent groups are solved on WORKERS processes.
+MULTI_SKU = False
+SKUS = 2000
+PERIODS = 26
+POOL_SIZE = 4
+WORKERS = 4
 
 # Linear price response functions (intercept, slope)
 snowsuit = [[80, 0.5], [80, 0.5], [30, 0.5], [30, 1.0]]
 jacket = [[120, 0.7], [90, 0.9], [80, 1.0], [50, 0.9]]
 snowpants = [[50, 0.8], [70, 0.4], [40, 0.4], [10, 0.4]]
 
-# Create a new optimization model to maximize revenue
-model = gb.Model("Markdown Optimization")
-
-# Construct the decision variables
-p = model.addVars(3, 4, lb=0, vtype=GRB.CONTINUOUS, name="Price")
-d = model.addVars(3, 4, lb=0, vtype=GRB.INTEGER, name="Month Demand")
-
-#Objective Function
-model.setObjective(gb.quicksum(p[i,n]*d[i,n] for i in range(3) for n in range(4)), GRB.MAXIMIZE)
-
-# Define the demand constraints
-for n in range(4):
-    model.addConstr(d[0,n] == snowsuit[n][0] - snowsuit[n][1]*p[0,n], "Demand Definition Snowsuits")
-    model.addConstr(d[1,n] == jacket[n][0] - jacket[n][1]*p[1,n], "Demand Definition Jackets")
-    model.addConstr(d[2,n] == snowpants[n][0] - snowpants[n][1]*p[2,n], "Demand Definition Snow Pants")
-
-# Demand must not exceed the number we have in stock
-model.addConstr(gb.quicksum(d[0,n] + d[1,n] for n in range(4)) <= 160, "Demand Constraint 1")
-model.addConstr(gb.quicksum(d[0,n] + d[2,n] for n in range(4)) <= 160, "Demand Constraint 2")
-    
-# Prices must be marked down month-over-month
-model.addConstrs((p[i,n] <= p[i,n-1] for i in range(3) for n in range(1,4)), "Markdown Constraint")
-      
-# Solve our model
-model.optimize()
-
-# Price of snowsuits 
-print("Snowsuit Prices from January to April: \n", ['%.2f' % p[0,n].x for n in range(4)])
-print("Jacket Prices from January to April: \n", ['%.2f' % p[1,n].x for n in range(4)])
-print("Snow Pant Prices from January to April: \n", ['%.2f' % p[2,n].x for n in range(4)])
+# The inventory pools: the products that share the stock and its size
+inventory = [([0, 1], 160), ([0, 2], 160)]
+
+# Substituting d = a - b*p into p*d gives the revenue a*p - b*p^2, which is
+# concave in the prices. Demand is nonnegative when p <= a/b, the inventory
+# constraints are linear in p and so are the markdowns. a and b are
+# (products x months) arrays. Returns the model, its prices and demands.
+def build_markdown_qp(a, b, inventory):
+    model = gb.Model("Markdown Optimization QP")
+    model.setParam('OutputFlag', 0)
+    p = model.addMVar(a.shape, lb=0, ub=a/b, name="Price")
+    model.setObjective((a*p).sum() - (b*p*p).sum(), GRB.MAXIMIZE)
+    for products, stock in inventory:
+        model.addConstr((a[products] - b[products]*p[products]).sum() <= stock, "Inventory")
+    model.addConstr(p[:, 1:] <= p[:, :-1], "Markdown Constraint")
+    return model, p
+
+# Round the demands of a QP solution down (so the inventory still holds)
+# and repair the markdowns: if a price rises from one month to the next, the
+# earlier demand is lowered until its price is at least the later one. The
+# demands only ever decrease, so the inventory constraints remain satisfied.
+# Demands stay >= 0 (prices <= a/b); if even a zero demand cannot bring the
+# earlier price up to the later one, there is no repair and None is returned.
+def repair_integer_demand(p, a, b, tolerance=1e-9):
+    d = np.maximum(np.floor(a - b*p + tolerance), 0)
+    for i in range(a.shape[0]):
+        n = 1
+        while n < a.shape[1]:
+            later = (a[i, n] - d[i, n])/b[i, n]
+            if (a[i, n-1] - d[i, n-1])/b[i, n-1] < later - tolerance:
+                d[i, n-1] = max(np.floor(a[i, n-1] - b[i, n-1]*later + tolerance), 0)
+                if (a[i, n-1] - d[i, n-1])/b[i, n-1] < later - tolerance:
+                    return None
+                n = max(n - 1, 1)
+            else:
+                n += 1
+    return (a - d)/b, d
+
+# Integer demands with an exact objective: in terms of d the revenue of a
+# product in a month is d*(a - d)/b, a concave function that is evaluated
+# exactly at every integer demand by a piecewise-linear objective. The
+# markdown and inventory constraints are linear in d as well.
+def build_markdown_pwl(a, b, inventory):
+    model = gb.Model("Markdown Optimization PWL")
+    model.setParam('OutputFlag', 0)
+    model.setParam('MIPGap', 0)
+    d = model.addVars(*a.shape, lb=0, ub=np.floor(a).tolist(), vtype=GRB.INTEGER, name="Month Demand")
+    for (i, n), demand in d.items():
+        k = np.arange(np.floor(a[i, n]) + 1)
+        model.setPWLObj(demand, k.tolist(), (k*(a[i, n] - k)/b[i, n]).tolist())
+    model.ModelSense = GRB.MAXIMIZE
+    for products, stock in inventory:
+        model.addConstr(gb.quicksum(d[i, n] for i in products for n in range(a.shape[1])) <= stock, "Inventory")
+    model.addConstrs(((a[i, n] - d[i, n])/b[i, n] <= (a[i, n-1] - d[i, n-1])/b[i, n-1]
+                      for i in range(a.shape[0]) for n in range(1, a.shape[1])), "Markdown Constraint")
+    return model, d
+
+# The table-driven engine works on two tables:
+#   response  one row per SKU and period: SKU, Period, Intercept, Slope
+#   pools     one row per SKU in an inventory pool: Pool, SKU, Stock
+# A SKU may belong to several pools (as snowsuits do above).
+
+# Build the concave QP for one group of SKUs with sparse constraint
+# matrices. a and b are (SKUs x periods) arrays and pools is a list of
+# (local SKU indices, stock). The prices are ordered SKU by SKU.
+def build_markdown_group(a, b, pools):
+    skus, periods = a.shape
+    model = gb.Model("Markdown Optimization Group")
+    model.setParam('OutputFlag', 0)
+    p = model.addMVar(skus*periods, lb=0, ub=(a/b).ravel(), name="Price")
+    model.setObjective(a.ravel() @ p - p @ sparse.diags(b.ravel()) @ p, GRB.MAXIMIZE)
+
+    # Inventory: sum of (a - b*p) over the pool <= stock, i.e. -b'p <= stock - sum(a)
+    rows, columns, values, rhs = [], [], [], []
+    for r, (members, stock) in enumerate(pools):
+        for i in members:
+            rows += [r]*periods
+            columns += range(i*periods, (i + 1)*periods)
+            values += (-b[i]).tolist()
+        rhs.append(stock - a[members].sum())
+    inventory = sparse.csr_matrix((values, (rows, columns)), shape=(len(pools), skus*periods))
+    model.addConstr(inventory @ p <= np.array(rhs), "Inventory")
+
+    # Markdowns: p[t] - p[t-1] <= 0 for every SKU
+    difference = sparse.diags([-np.ones(periods - 1), np.ones(periods - 1)], [0, 1], shape=(periods - 1, periods))
+    model.addConstr(sparse.kron(sparse.eye(skus), difference, format='csr') @ p <= 0, "Markdown Constraint")
+    return model, p
+
+# Solve a list of independent groups (a worker task). Each group is
+# (SKU names, a, b, pools); returns (SKU names, prices, demands) per group.
+# A group whose integer demands cannot be repaired is solved with the PWL model.
+def solve_markdown_groups(groups, integer_demand='continuous'):
+    results = []
+    for names, a, b, pools in groups:
+        model, p = build_markdown_group(a, b, pools)
+        model.optimize()
+        if model.status != GRB.OPTIMAL:
+            raise RuntimeError("The markdown model ended with status %d" % model.status)
+        prices = p.X.reshape(a.shape)
+        model.dispose()
+        if integer_demand == 'repair':
+            repaired = repair_integer_demand(prices, a, b)
+            if repaired is None:
+                prices, demand, _ = solve_markdown(a, b, pools, 'piecewise')
+            else:
+                prices, demand = repaired
+        else:
+            demand = a - b*prices
+        results.append((names, prices, demand))
+    return results
+
+# Split the catalogue into independent groups: SKUs that share an inventory
+# pool (directly or through other SKUs) are connected components of the
+# SKU-pool graph. SKUs without a pool form groups of their own.
+def markdown_groups(response, pools):
+    names = pd.Index(response['SKU'].unique())
+    pool_names = pd.Index(pools['Pool'].unique())
+    membership = sparse.csr_matrix((np.ones(len(pools)), (names.get_indexer(pools['SKU']), pool_names.get_indexer(pools['Pool']))),
+                                   shape=(len(names), len(pool_names)))
+    graph = sparse.bmat([[None, membership], [membership.T, None]])
+    _, labels = connected_components(graph, directed=False)
+
+    # The intercepts and slopes as (SKUs x periods) arrays
+    table = response.sort_values(['SKU', 'Period'])
+    a = table.pivot(index='SKU', columns='Period', values='Intercept').loc[names].to_numpy(dtype=float)
+    b = table.pivot(index='SKU', columns='Period', values='Slope').loc[names].to_numpy(dtype=float)
+    stock = pools.groupby('Pool')['Stock'].first()
+    skus = pools.groupby('Pool')['SKU'].apply(list)
+
+    groups = []
+    for label in np.unique(labels[:len(names)]):
+        members = np.flatnonzero(labels[:len(names)] == label)
+        local = pd.Series(range(len(members)), index=names[members])
+        group_pools = [(local[skus[pool]].tolist(), stock[pool]) for pool in pool_names[labels[len(names):] == label]]
+        groups.append((names[members].tolist(), a[members], b[members], group_pools))
+    return groups
+
+# Solve the whole catalogue: the groups are dealt out to the workers and
+# solved independently. Returns a table with the price and demand of every
+# SKU and period.
+def solve_markdown_table(response, pools, workers=WORKERS, integer_demand='continuous'):
+    groups = markdown_groups(response, pools)
+    tasks = [groups[k::workers] for k in range(min(workers, len(groups)))]
+    if len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+            results = [r for task in pool.map(solve_markdown_groups, tasks, [integer_demand]*len(tasks)) for r in task]
+    else:
+        results = solve_markdown_groups(groups, integer_demand)
+
+    periods = sorted(response['Period'].unique())
+    rows = [(name, period, prices[k, t], demand[k, t])
+            for names, prices, demand in results for k, name in enumerate(names) for t, period in enumerate(periods)]
+    return pd.DataFrame(rows, columns=['SKU', 'Period', 'Price', 'Demand'])
+
+# A synthetic catalogue: every group of pool_size SKUs shares one pool that
+# holds 60% of the demand at the unconstrained revenue-maximizing prices.
+# The intercepts fall over the season with a constant slope per SKU, so the
+# highest sensible price a/b falls too and the markdowns are feasible.
+def synthetic_catalogue(skus, periods, pool_size, rng):
+    decay = np.sort(rng.uniform(0.4, 1.0, size=(skus, periods)), axis=1)[:, ::-1]
+    intercept = rng.uniform(20, 120, size=(skus, 1))*decay
+    slope = np.repeat(rng.uniform(0.3, 1.0, size=(skus, 1)), periods, axis=1)
+    names = ["SKU %d" % k for k in range(skus)]
+    response = pd.DataFrame({'SKU': np.repeat(names, periods), 'Period': np.tile(np.arange(1, periods + 1), skus),
+                             'Intercept': intercept.ravel(), 'Slope': slope.ravel()})
+    pool = np.arange(skus)//pool_size
+    stock = pd.Series(intercept.sum(axis=1)/2).groupby(pool).sum()*0.6
+    pools = pd.DataFrame({'Pool': pool, 'SKU': names, 'Stock': stock[pool].to_numpy()})
+    return response, pools
+
+# Solve the reformulation with the chosen handling of integer demand.
+# Returns the prices, demands and revenue. When the QP demands cannot be
+# repaired, the exact piecewise-linear model is solved instead.
+def solve_markdown(a, b, inventory, integer_demand=INTEGER_DEMAND):
+    if integer_demand == 'repair':
+        model, p = build_markdown_qp(a, b, inventory)
+        model.optimize()
+        repaired = repair_integer_demand(p.X, a, b)
+        if repaired is not None:
+            prices, demand = repaired
+            return prices, demand, float((prices*demand).sum())
+        integer_demand = 'piecewise'
+
+    if integer_demand == 'piecewise':
+        model, d = build_markdown_pwl(a, b, inventory)
+        model.optimize()
+        demand = np.array([[d[i, n].X for n in range(a.shape[1])] for i in range(a.shape[0])]).round()
+        prices = (a - demand)/b
+    else:
+        model, p = build_markdown_qp(a, b, inventory)
+        model.optimize()
+        prices = p.X
+        demand = a - b*prices
+    return prices, demand, float((prices*demand).sum())
+
+if __name__ == "__main__":
+
+    # Create a new optimization model to maximize revenue
+    model = gb.Model("Markdown Optimization")
+
+    # Construct the decision variables
+    p = model.addVars(3, 4, lb=0, vtype=GRB.CONTINUOUS, name="Price")
+    d = model.addVars(3, 4, lb=0, vtype=GRB.INTEGER, name="Month Demand")
+
+    #Objective Function
+    model.setObjective(gb.quicksum(p[i,n]*d[i,n] for i in range(3) for n in range(4)), GRB.MAXIMIZE)
+
+    # Define the demand constraints
+    for n in range(4):
+        model.addConstr(d[0,n] == snowsuit[n][0] - snowsuit[n][1]*p[0,n], "Demand Definition Snowsuits")
+        model.addConstr(d[1,n] == jacket[n][0] - jacket[n][1]*p[1,n], "Demand Definition Jackets")
+        model.addConstr(d[2,n] == snowpants[n][0] - snowpants[n][1]*p[2,n], "Demand Definition Snow Pants")
+
+    # Demand must not exceed the number we have in stock
+    model.addConstr(gb.quicksum(d[0,n] + d[1,n] for n in range(4)) <= 160, "Demand Constraint 1")
+    model.addConstr(gb.quicksum(d[0,n] + d[2,n] for n in range(4)) <= 160, "Demand Constraint 2")
+
+    # Prices must be marked down month-over-month
+    model.addConstrs((p[i,n] <= p[i,n-1] for i in range(3) for n in range(1,4)), "Markdown Constraint")
+
+    # Solve our model
+    model.optimize()
+
+    # Price of snowsuits 
+    print("Snowsuit Prices from January to April: \n", ['%.2f' % p[0,n].x for n in range(4)])
+    print("Jacket Prices from January to April: \n", ['%.2f' % p[1,n].x for n in range(4)])
+    print("Snow Pant Prices from January to April: \n", ['%.2f' % p[2,n].x for n in range(4)])
+
+    # Did you want to solve the reformulation in prices only?
+    if REFORMULATE:
+        a = np.array([[r[0] for r in response] for response in (snowsuit, jacket, snowpants)], dtype=float)
+        b = np.array([[r[1] for r in response] for response in (snowsuit, jacket, snowpants)], dtype=float)
+        prices, demand, revenue = solve_markdown(a, b, inventory)
+        print("\nReformulated revenue (%s demand): %.2f" % (INTEGER_DEMAND, revenue))
+        print("Bilinear MIQCP revenue: %.2f" % model.objVal)
+        for name, row in zip(["Snowsuit", "Jacket", "Snow Pant"], prices):
+            print(name + " Prices from January to April: \n", ['%.2f' % price for price in row])
+
+    # Did you want to run the table-driven engine?
+    if MULTI_SKU:
+
+        # The three products above as tables: the engine finds one group
+        names = ["Snowsuit", "Jacket", "Snow Pant"]
+        response = pd.DataFrame([(names[i], n + 1, r[0], r[1]) for i, product in enumerate((snowsuit, jacket, snowpants))
+                                 for n, r in enumerate(product)], columns=['SKU', 'Period', 'Intercept', 'Slope'])
+        pools = pd.DataFrame([(k, names[i], stock) for k, (products, stock) in enumerate(inventory) for i in products],
+                             columns=['Pool', 'SKU', 'Stock'])
+        solution = solve_markdown_table(response, pools, workers=1)
+        print("\nTable-driven revenue (continuous demand): %.2f" % (solution['Price']*solution['Demand']).sum())
+
+        # A large synthetic catalogue
+        response, pools = synthetic_catalogue(SKUS, PERIODS, POOL_SIZE, np.random.default_rng(2025))
+        start = time.time()
+        solution = solve_markdown_table(response, pools)
+        print("%d SKUs x %d weeks in %d pools: revenue %.2f in %.1f seconds" % (SKUS, PERIODS, pools['Pool'].nunique(),
+              (solution['Price']*solution['Demand']).sum(), time.time() - start))
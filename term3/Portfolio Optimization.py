@@ -3,12 +3,16 @@
 """
 
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 from gurobipy import GRB
 import gurobipy as gb
 import pandas as pd
 import yfinance as yf
 import numpy as np
+import scipy.sparse as sparse
 from math import sqrt
+import hashlib
+import os
 
 # Compute minimum risk portfolio or efficient frontier?
 FRONTIER = True
@@ -16,138 +20,450 @@ FRONTIER = True
 # Should we download the data?
 READ_FILES = True
 
-if READ_FILES:
-
-    # Read the closing prices and ticker symbols
-    df = pd.read_csv("https://raw.githubusercontent.com/EthanRosehart/schulich_data_science/refs/heads/main/term3/stock_closing_prices.csv")
-    symbols = pd.read_csv("https://raw.githubusercontent.com/EthanRosehart/schulich_data_science/refs/heads/main/term3/symbols.csv")
-    stocks = symbols["Symbol"].values.tolist()
-
-    # Matrix of daily closing prices for each stock in the S&P 500
-    closes = np.transpose(np.array(df)) 
-
-else:
-    
-    # Read the ticker symbols
-    symbols = pd.read_csv("symbols.csv")
-    
-    # Read the ticker symbols of the S&P 500 from the file    
-    stocks = symbols["Symbol"].values.tolist()
-    
-    # Download two years worth of data for each stock from Yahoo Finance
-    data = yf.download(stocks, period='2y')
-
-    # We only need the closing prices
-    df = data.Close
-    
-    # Write this data to a file
-    # df.to_csv("stock_closing_prices.csv", index=False)
-    
-    # Matrix of daily closing prices for each stock in the S&P 500
-    closes = np.transpose(np.array(data.Close)) 
-
-
-# The absolute change in daily closing prices for each stock on the S&P 500
-absdiff = np.diff(closes)                   
-
-# Compute the daily return for each stock on the S&P 500 by dividing the 
-# absolute difference in closes prices by the starting share price. Note
-# that this normalizes the return so it doesn't depend on share prices.
-reldiff = np.divide(absdiff, closes[:,:-1]) 
-
-# The mean return for each stoch on the S&P 500
-mu = np.mean(reldiff, axis=1)
-
-# The standard deviation of returns (diagonal of the covariance matrix)
-std = np.std(reldiff, axis=1)               
-
-# The convariance matrix associated with the returns 
-sigma = np.cov(reldiff)                     
-
-# Find the nan values for mu and std
-nan_indices_mu = np.isnan(mu)
-nan_indices_std = np.isnan(std)
-nan_indices_combined = np.logical_or(nan_indices_mu, nan_indices_std) 
-
-# Remove the nan values for mu, std, and sigma
-mu = mu[~nan_indices_combined]
-std = std[~nan_indices_combined]
-sigma = sigma[~nan_indices_combined][:, ~nan_indices_combined]
-
-# Create an empty optimization model
-model = gb.Model('Portfolio Optimization')
-
-# Add decision variables for the non-nan stocks
-stock_index = range(len(mu))
-x = model.addVars(stock_index, lb=0, vtype=gb.GRB.CONTINUOUS, name="Fraction")
-
-# Objective is to minimize risk.  This is modeled using the
-# covariance matrix, which measures the historical correlation between stocks
-portfolio_risk = gb.quicksum(x[i]*x[j]*sigma[i,j] for i in stock_index for j in stock_index)
-model.setObjective(portfolio_risk, GRB.MINIMIZE)
-
-# The proportion constraints ensure we invest our entire portfolio
-model.addConstr(gb.quicksum(x[i] for i in stock_index) == 1)
-
-# Optimize model to find the minimum risk portfolio
-model.optimize()
-
-# Create an array of proportions which represent the optimal solution
-x_flat = np.array([x[i].x for i in stock_index])
-
-# Comptue the minimum risk of the portfolio as well as the expected return (daily)
-minrisk_volatility = sqrt(model.objval)
-minrisk_return = mu @ x_flat
-
-# Convert the average daily values into a yearly value (251 working days).
-# Then, convert these yearly values into a percentage.
-number_of_days = len(closes[0])/2       # This equals 251
-minrisk_return_out = minrisk_return*number_of_days*100
-minrisk_volatility_out = minrisk_volatility*sqrt(number_of_days)*100
-
-# Print the composition of the portfolio the minimizes the risk.
-primary_investments = [i for i in range(len(mu)) if x_flat[i] > 0.01]
-filtered_stocks = [stock for i, stock in enumerate(stocks) if not nan_indices_combined[i]]
-for i in primary_investments:
-    print(filtered_stocks[i], x_flat[i])
-    
-# Print out the return and volatility of the portfolio
-print("Expected Yearly Return (%): ", minrisk_return_out)
-print("Expected Yearly Volatility (%): ", minrisk_volatility_out)
-    
-# Did you want to compute the efficient frontier?
-if FRONTIER:
-
-    # Create an expression representing the expected return for the portfolio; add this as a constraint
-    target = model.addConstr(gb.quicksum(mu[i]*x[i] for i in stock_index) >= minrisk_return, 'target')
-    
-    # Solve for efficient frontier by varying the mean return
-    frontier = np.empty((2,0))
-    for r in np.linspace(mu.min(), mu.max(), 25):
+# The number of points on the efficient frontier and the number of worker
+# processes used to compute them (1 = solve in this process)
+FRONTIER_POINTS = 500
+WORKERS = 4
+
+# Should the risk be modeled with a factor model instead of the full covariance matrix?
+FACTOR_MODEL = False
+FACTORS = 10
+
+# Covariance estimator ('sample' or 'ledoit-wolf'), the floating point precision
+# of the computation, the number of days per block and where results are cached
+COVARIANCE = 'sample'
+PRECISION = np.float64
+CHUNK = 128
+CACHE_DIR = "portfolio_cache"
+
+# Should we rebalance with a limit on the number of holdings, minimum lot sizes
+# and transaction costs? The prior portfolio defaults to equal weights and the
+# transaction cost is charged per unit of turnover in the same units as the
+# (daily) variance. Set MAX_TURNOVER to cap the total turnover.
+REBALANCE = False
+MAX_HOLDINGS = 20
+MIN_LOT = 0.02
+TRANSACTION_COST = 1e-5
+MAX_TURNOVER = None
+
+# Should we run a walk-forward backtest? The covariance is estimated over the
+# last WINDOW days and the minimum risk portfolio is rebalanced every HOLDING
+# days. The running sums are recomputed from scratch every REFRESH rebalances
+# to stop rounding errors from the downdates accumulating.
+BACKTEST = False
+WINDOW = 250
+HOLDING = 5
+REFRESH = 100
+
+# The covariance of the returns (one stock per row), accumulated over blocks
+# of chunk days so that only one block of centered returns exists at a time.
+# Also returns ||r_t||^2 of every centered day for the Ledoit-Wolf estimator.
+def chunked_covariance(returns, chunk=CHUNK):
+    mean = returns.mean(axis=1, keepdims=True)
+    sigma = np.zeros((len(returns), len(returns)), dtype=returns.dtype)
+    norms = np.empty(returns.shape[1], dtype=returns.dtype)
+    for t in range(0, returns.shape[1], chunk):
+        block = returns[:, t:t+chunk] - mean
+        sigma += block @ block.T
+        norms[t:t+chunk] = np.sum(block**2, axis=0)
+    return sigma/(returns.shape[1] - 1), norms
+
+# Ledoit-Wolf shrinkage of the sample covariance towards a scaled identity.
+# The shrinkage intensity uses sum_t ||r_t r_t' - S||^2 = sum_t ||r_t||^4 - T||S||^2.
+def ledoit_wolf(sigma, norms):
+    n, T = len(sigma), len(norms)
+    S = sigma*(T - 1)/T
+    scale = np.trace(S)/n
+    d2 = (np.sum(S**2) - 2*scale*np.trace(S) + n*scale**2)/n
+    b2 = (np.sum(norms**2) - T*np.sum(S**2))/(n*T**2)
+    shrinkage = 0.0 if d2 == 0 else min(b2, d2)/d2
+    return shrinkage*scale*np.eye(n, dtype=sigma.dtype) + (1 - shrinkage)*S, shrinkage
+
+# Compute the returns statistics for every ticker with a complete price history.
+# Tickers with missing (or non-positive) prices are masked before the returns
+# are computed. The results are cached by the hash of the prices and settings.
+def returns_statistics(closes, estimator=COVARIANCE, dtype=PRECISION, k=FACTORS, cache_dir=CACHE_DIR):
+    key = hashlib.sha256(np.ascontiguousarray(closes, dtype=np.float64).tobytes())
+    key.update(("%s %s %d" % (estimator, np.dtype(dtype).name, k)).encode())
+    path = None if cache_dir is None else os.path.join(cache_dir, key.hexdigest() + ".npz")
+    if path is not None and os.path.exists(path):
+        cached = np.load(path)
+        return tuple(cached[name] for name in ('valid', 'mu', 'std', 'sigma', 'factors', 'specific'))
+
+    valid = np.all(np.nan_to_num(closes, nan=-1.0) > 0, axis=1)
+    prices = closes[valid].astype(dtype)
+    returns = np.diff(prices)/prices[:, :-1]
+
+    # The mean return, standard deviation and covariance matrix of each stock
+    mu = returns.mean(axis=1)
+    std = returns.std(axis=1)
+    sigma, norms = chunked_covariance(returns)
+    if estimator == 'ledoit-wolf':
+        sigma, shrinkage = ledoit_wolf(sigma, norms)
+        print("Ledoit-Wolf Shrinkage Intensity: ", shrinkage)
+
+    # Gurobi works in double precision
+    mu, std, sigma = mu.astype(np.float64), std.astype(np.float64), sigma.astype(np.float64)
+    factors, specific = pca_factors(sigma, k)
+
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(path, valid=valid, mu=mu, std=std, sigma=sigma, factors=factors, specific=specific)
+    return valid, mu, std, sigma, factors, specific
+
+# Approximate the covariance with a factor model sigma = F'F + diag(specific)
+# using its k leading principal components
+def pca_factors(sigma, k):
+    eigenvalues, eigenvectors = np.linalg.eigh(sigma)
+    eigenvalues, eigenvectors = eigenvalues[::-1][:k], eigenvectors[:, ::-1][:, :k]
+    factors = np.sqrt(np.maximum(eigenvalues, 0))[:, None] * eigenvectors.T
+    specific = np.maximum(np.diag(sigma) - (factors**2).sum(axis=0), 0)
+    return factors, specific
+
+# Build the minimum risk model with the matrix API. With a factor model, the
+# risk is y'y + x'diag(specific)x where y = Fx are the factor exposures, so the
+# quadratic objective only has k + n diagonal terms instead of n^2 terms.
+def build_portfolio_model(mu, sigma=None, factors=None, specific=None):
+    model = gb.Model('Portfolio Optimization')
+    x = model.addMVar(len(mu), lb=0, vtype=GRB.CONTINUOUS, name="Fraction")
+    if factors is None:
+        model.setObjective(x @ sigma @ x, GRB.MINIMIZE)
+    else:
+        y = model.addMVar(len(factors), lb=-GRB.INFINITY, vtype=GRB.CONTINUOUS, name="Exposure")
+        model.addConstr(y == factors @ x, "Factor Exposure")
+        model.setObjective(y @ y + x @ sparse.diags(specific) @ x, GRB.MINIMIZE)
+
+    # The proportion constraints ensure we invest our entire portfolio
+    model.addConstr(x.sum() == 1, "Budget")
+    return model, x
+
+# Build the rebalancing MIQP. A diagonal part D of the risk is split off (the
+# specific risk of a factor model, or a multiple of the identity below the
+# smallest eigenvalue of sigma) and written in perspective form
+#   D_i x_i^2 / z_i  ->  D_i s_i  with  x_i^2 <= s_i z_i
+# which gives a much tighter relaxation than x_i <= z_i (big-M) on its own.
+def build_rebalance_model(mu, prior, sigma=None, factors=None, specific=None, max_holdings=MAX_HOLDINGS,
+                          min_lot=MIN_LOT, cost=TRANSACTION_COST, max_turnover=MAX_TURNOVER):
+    n = len(mu)
+    model = gb.Model('Portfolio Rebalancing')
+    x = model.addMVar(n, lb=0, ub=1, vtype=GRB.CONTINUOUS, name="Fraction")
+    z = model.addMVar(n, vtype=GRB.BINARY, name="Hold")
+    s = model.addMVar(n, lb=0, vtype=GRB.CONTINUOUS, name="Perspective")
+    buy = model.addMVar(n, lb=0, vtype=GRB.CONTINUOUS, name="Buy")
+    sell = model.addMVar(n, lb=0, vtype=GRB.CONTINUOUS, name="Sell")
+
+    if factors is None:
+        diagonal = np.full(n, 0.99*max(np.linalg.eigvalsh(sigma)[0], 0.0))
+        risk = x @ (sigma - np.diag(diagonal)) @ x
+    else:
+        diagonal = specific
+        y = model.addMVar(len(factors), lb=-GRB.INFINITY, vtype=GRB.CONTINUOUS, name="Exposure")
+        model.addConstr(y == factors @ x, "Factor Exposure")
+        risk = y @ y
+    model.setObjective(risk + diagonal @ s + cost*(buy.sum() + sell.sum()), GRB.MINIMIZE)
+
+    # Invest the entire portfolio in at most max_holdings stocks, each with a minimum lot
+    model.addConstr(x.sum() == 1, "Budget")
+    model.addConstr(x * x <= s * z, "Perspective")
+    model.addConstr(x <= z, "Holding")
+    model.addConstr(x >= min_lot * z, "Minimum Lot")
+    model.addConstr(z.sum() <= max_holdings, "Cardinality")
+
+    # Trades away from the prior portfolio
+    model.addConstr(x - buy + sell == prior, "Turnover")
+    if max_turnover is not None:
+        model.addConstr(buy.sum() + sell.sum() <= max_turnover, "Maximum Turnover")
+    return model, x, z
+
+# Warm start the MIQP by holding the max_holdings largest positions of the
+# continuous solution. Gurobi completes the start by solving for x with z fixed.
+def top_k_start(z, continuous, max_holdings=MAX_HOLDINGS):
+    start = np.zeros(len(continuous))
+    start[np.argsort(continuous)[::-1][:max_holdings]] = 1
+    z.Start = start
+
+
+# The portfolio variance x'sigma x for each row of solutions
+def portfolio_variance(solutions, sigma=None, factors=None, specific=None):
+    if factors is None:
+        return np.einsum('ij,jk,ik->i', solutions, sigma, solutions)
+    return ((solutions @ factors.T)**2).sum(axis=1) + (solutions**2) @ specific
+
+# Running sums of the returns in an estimation window (one day per row). Sliding
+# the window is a rank-k update with the entering days and a rank-k downdate
+# with the leaving days instead of a full np.cov over the window.
+class RollingMoments:
+
+    def __init__(self, returns):
+        self.count = len(returns)
+        self.total = returns.sum(axis=0)
+        self.cross = returns.T @ returns
+
+    def slide(self, entering, leaving):
+        self.total += entering.sum(axis=0) - leaving.sum(axis=0)
+        self.cross += entering.T @ entering - leaving.T @ leaving
+
+    def covariance(self):
+        return (self.cross - np.outer(self.total, self.total)/self.count)/(self.count - 1)
+
+# Walk forward through the returns (one day per row). At each rebalance date
+# the minimum risk portfolio is re-solved on one persistent model; only the
+# quadratic objective changes, so the previous basis is still primal feasible
+# and primal simplex restarts from it. Each portfolio is then held (and left
+# to drift) for the next holding period.
+def backtest(returns, window=WINDOW, holding=HOLDING, refresh=REFRESH):
+    days, n = returns.shape
+    dates = np.arange(window, days, holding)
+    realized = np.empty(len(dates))
+    turnover = np.empty(len(dates))
+
+    model = gb.Model('Portfolio Backtest')
+    model.setParam('OutputFlag', 0)
+    model.setParam('Method', 0)
+    x = model.addMVar(n, lb=0, vtype=GRB.CONTINUOUS, name="Fraction")
+    model.addConstr(x.sum() == 1, "Budget")
+
+    moments = RollingMoments(returns[:window])
+    drifted = np.zeros(n)
+    for k, t in enumerate(dates):
+        if k > 0:
+            if k % refresh == 0:
+                moments = RollingMoments(returns[t-window:t])
+            else:
+                moments.slide(returns[dates[k-1]:t], returns[dates[k-1]-window:t-window])
+
+        model.setObjective(x @ moments.covariance() @ x, GRB.MINIMIZE)
+        model.optimize()
+        weights = x.X
+
+        # Hold the portfolio until the next rebalance date
+        growth = np.prod(1 + returns[t:t+holding], axis=0)
+        realized[k] = weights @ growth - 1
+        turnover[k] = np.abs(weights - drifted).sum()
+        drifted = weights*growth/(weights @ growth)
+
+    model.dispose()
+    return dates, realized, turnover
+
+# Every worker process keeps its own copy of the frontier model
+frontier_model = None
+
+def init_frontier_worker(mu, sigma, factors, specific):
+    global frontier_model
+    model, x = build_portfolio_model(mu, sigma, factors, specific)
+    model.setParam('OutputFlag', 0)
+
+    # Only the right-hand side of the target changes between solves, so the
+    # dual simplex method can restart from the basis of the previous target
+    model.setParam('Method', 1)
+    target = model.addConstr(mu @ x >= mu.min(), 'target')
+    frontier_model = (model, x, target)
+
+# Solve a sorted block of return targets. Each solve is warm-started from the
+# solution of its neighbouring target in the block.
+def solve_frontier_targets(targets):
+    model, x, target = frontier_model
+    solutions = np.empty((len(targets), x.shape[0]))
+    for k, r in enumerate(targets):
         target.rhs = r
         model.optimize()
-        frontier = np.append(frontier, [[sqrt(model.objval)],[r]], axis=1)
-    
-    # Plot the efficient frontier
-    fig, ax = plt.subplots(figsize=(10,8))
-    
-    # Plot volatility versus expected return for individual stocks
-    ax.scatter(x=std, y=mu, color='Blue', label='Individual Stocks')
-    for i, stock in enumerate(filtered_stocks):
-        ax.annotate(stock, (std[i], mu[i]))
-    
-    # Plot volatility versus expected return for minimum risk portfolio
-    ax.scatter(x=minrisk_volatility, y=minrisk_return, color='DarkGreen')
-    ax.annotate('Minimum\nRisk\nPortfolio', (minrisk_volatility, minrisk_return), horizontalalignment='right')
-    
-    # Plot efficient frontier
-    ax.plot(frontier[0], frontier[1], label='Efficient Frontier', color='DarkGreen')
-    
-    # Format and display the final plot
-    ax.axis([frontier[0].min()*0.7, frontier[0].max()*1.3, mu.min()*1.2, mu.max()*1.2])
-    ax.set_xlabel('Volatility (standard deviation)')
-    ax.set_ylabel('Expected Return')
-    ax.legend()
-    ax.grid()
-    plt.show()
-    
\ No newline at end of file
+        solutions[k] = x.X
+    return solutions
+
+# The set of stocks held and whether the return target binds. On an interval
+# of targets where this does not change (a segment of the critical line) the
+# optimal portfolio is an affine function of the target.
+def active_set(solution, mu, r, tolerance=1e-6):
+    return tuple(np.flatnonzero(solution > tolerance)), bool(mu @ solution <= r + tolerance)
+
+# Trace the efficient frontier at evenly spaced return targets. A coarse grid
+# is solved first; intervals whose end points have different active sets are
+# bisected until every interval lies on one critical line segment, and the
+# portfolios in between are then interpolated exactly.
+def efficient_frontier(mu, sigma=None, factors=None, specific=None, points=FRONTIER_POINTS, workers=WORKERS):
+    targets = np.linspace(mu.min(), mu.max(), points)
+    solutions = np.full((points, len(mu)), np.nan)
+    signatures = [None]*points
+    solved = np.zeros(points, dtype=bool)
+
+    # Solve the grid indices in contiguous blocks, one per worker
+    def solve(indices, map_blocks):
+        indices = np.sort(indices)
+        blocks = [b for b in np.array_split(indices, min(workers, len(indices))) if len(b)]
+        for block, block_solutions in zip(blocks, map_blocks(solve_frontier_targets, [targets[b] for b in blocks])):
+            solutions[block] = block_solutions
+            solved[block] = True
+            for i in block:
+                signatures[i] = active_set(solutions[i], mu, targets[i])
+
+    def trace(map_blocks):
+        solve(np.unique(np.linspace(0, points - 1, 4*max(workers, 1) + 1).astype(int)), map_blocks)
+        while True:
+            knots = np.flatnonzero(solved)
+            midpoints = [(i + j)//2 for i, j in zip(knots[:-1], knots[1:]) if j - i > 1 and signatures[i] != signatures[j]]
+            if not midpoints:
+                break
+            solve(np.array(midpoints), map_blocks)
+
+    if workers <= 1:
+        init_frontier_worker(mu, sigma, factors, specific)
+        trace(map)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_frontier_worker,
+                                 initargs=(mu, sigma, factors, specific)) as pool:
+            trace(pool.map)
+
+    # Interpolate the portfolios between the solved targets
+    knots = np.flatnonzero(solved)
+    for i, j in zip(knots[:-1], knots[1:]):
+        if j - i > 1:
+            weight = ((targets[i+1:j] - targets[i])/(targets[j] - targets[i]))[:, None]
+            solutions[i+1:j] = (1 - weight)*solutions[i] + weight*solutions[j]
+
+    volatility = np.sqrt(portfolio_variance(solutions, sigma, factors, specific))
+    return np.vstack((volatility, targets)), solutions, len(knots)
+
+
+if __name__ == "__main__":
+
+    if READ_FILES:
+
+        # Read the closing prices and ticker symbols
+        df = pd.read_csv("https://raw.githubusercontent.com/EthanRosehart/schulich_data_science/refs/heads/main/term3/stock_closing_prices.csv")
+        symbols = pd.read_csv("https://raw.githubusercontent.com/EthanRosehart/schulich_data_science/refs/heads/main/term3/symbols.csv")
+        stocks = symbols["Symbol"].values.tolist()
+
+        # Matrix of daily closing prices for each stock in the S&P 500
+        closes = np.transpose(np.array(df)) 
+
+    else:
+
+        # Read the ticker symbols
+        symbols = pd.read_csv("symbols.csv")
+
+        # Read the ticker symbols of the S&P 500 from the file    
+        stocks = symbols["Symbol"].values.tolist()
+
+        # Download two years worth of data for each stock from Yahoo Finance
+        data = yf.download(stocks, period='2y')
+
+        # We only need the closing prices
+        df = data.Close
+
+        # Write this data to a file
+        # df.to_csv("stock_closing_prices.csv", index=False)
+
+        # Matrix of daily closing prices for each stock in the S&P 500
+        closes = np.transpose(np.array(data.Close)) 
+
+
+    # Compute the daily return for each stock on the S&P 500 by dividing the
+    # absolute difference in closes prices by the starting share price. Stocks
+    # with missing prices are removed first. We then compute the mean return,
+    # the standard deviation and the covariance matrix of the returns.
+    valid, mu, std, sigma, factors, specific = returns_statistics(closes)
+    nan_indices_combined = ~valid
+
+    # Objective is to minimize risk.  This is modeled using the
+    # covariance matrix, which measures the historical correlation between stocks
+    if FACTOR_MODEL:
+        model, x = build_portfolio_model(mu, factors=factors, specific=specific)
+    else:
+        model, x = build_portfolio_model(mu, sigma)
+
+    # Optimize model to find the minimum risk portfolio
+    model.optimize()
+
+    # Create an array of proportions which represent the optimal solution
+    x_flat = x.X
+
+    # Comptue the minimum risk of the portfolio as well as the expected return (daily)
+    minrisk_volatility = sqrt(model.objval)
+    minrisk_return = mu @ x_flat
+
+    # Convert the average daily values into a yearly value (251 working days).
+    # Then, convert these yearly values into a percentage.
+    number_of_days = len(closes[0])/2       # This equals 251
+    minrisk_return_out = minrisk_return*number_of_days*100
+    minrisk_volatility_out = minrisk_volatility*sqrt(number_of_days)*100
+
+    # Print the composition of the portfolio the minimizes the risk.
+    primary_investments = [i for i in range(len(mu)) if x_flat[i] > 0.01]
+    filtered_stocks = [stock for i, stock in enumerate(stocks) if not nan_indices_combined[i]]
+    for i in primary_investments:
+        print(filtered_stocks[i], x_flat[i])
+
+    # Print out the return and volatility of the portfolio
+    print("Expected Yearly Return (%): ", minrisk_return_out)
+    print("Expected Yearly Volatility (%): ", minrisk_volatility_out)
+
+    # Did you want to rebalance with cardinality, lot size and turnover constraints?
+    if REBALANCE:
+
+        prior = np.full(len(mu), 1.0/len(mu))
+        if FACTOR_MODEL:
+            rebalance, w, hold = build_rebalance_model(mu, prior, factors=factors, specific=specific)
+        else:
+            rebalance, w, hold = build_rebalance_model(mu, prior, sigma)
+        top_k_start(hold, x_flat)
+        rebalance.optimize()
+
+        # Print the composition of the rebalanced portfolio
+        if rebalance.SolCount > 0:
+            w_flat = w.X
+            for i in np.flatnonzero(hold.X > 0.5):
+                print(filtered_stocks[i], w_flat[i])
+            print("Holdings: ", int(round(hold.X.sum())), " Turnover: ", np.abs(w_flat - prior).sum())
+            print("Rebalanced Yearly Return (%): ", mu @ w_flat*number_of_days*100)
+            print("Rebalanced Yearly Volatility (%): ", sqrt(portfolio_variance(w_flat[None, :], sigma, factors, specific)[0])*sqrt(number_of_days)*100)
+        else:
+            print("No feasible rebalanced portfolio found. Status:", rebalance.status)
+
+    # Did you want to run a walk-forward backtest?
+    if BACKTEST:
+
+        # The daily returns of the stocks with a complete price history
+        prices = closes[valid]
+        returns = (np.diff(prices)/prices[:, :-1]).T
+        dates, realized, turnover = backtest(returns)
+
+        # Annualize the realized returns of each holding period
+        periods_per_year = number_of_days/HOLDING
+        print("Rebalance Dates: ", len(dates))
+        print("Realized Yearly Return (%): ", (np.prod(1 + realized)**(periods_per_year/len(realized)) - 1)*100)
+        print("Realized Yearly Volatility (%): ", np.std(realized, ddof=1)*sqrt(periods_per_year)*100)
+        print("Average Turnover per Rebalance: ", turnover[1:].mean() if len(turnover) > 1 else 0.0)
+
+    # Did you want to compute the efficient frontier?
+    if FRONTIER:
+
+        # Solve for efficient frontier by varying the mean return
+        if FACTOR_MODEL:
+            frontier, portfolios, solves = efficient_frontier(mu, factors=factors, specific=specific)
+        else:
+            frontier, portfolios, solves = efficient_frontier(mu, sigma)
+        print("Frontier Points: ", FRONTIER_POINTS, " Quadratic Programs Solved: ", solves)
+
+        # Plot the efficient frontier
+        fig, ax = plt.subplots(figsize=(10,8))
+
+        # Plot volatility versus expected return for individual stocks
+        ax.scatter(x=std, y=mu, color='Blue', label='Individual Stocks')
+        for i, stock in enumerate(filtered_stocks):
+            ax.annotate(stock, (std[i], mu[i]))
+
+        # Plot volatility versus expected return for minimum risk portfolio
+        ax.scatter(x=minrisk_volatility, y=minrisk_return, color='DarkGreen')
+        ax.annotate('Minimum\nRisk\nPortfolio', (minrisk_volatility, minrisk_return), horizontalalignment='right')
+
+        # Plot efficient frontier
+        ax.plot(frontier[0], frontier[1], label='Efficient Frontier', color='DarkGreen')
+
+        # Format and display the final plot
+        ax.axis([frontier[0].min()*0.7, frontier[0].max()*1.3, mu.min()*1.2, mu.max()*1.2])
+        ax.set_xlabel('Volatility (standard deviation)')
+        ax.set_ylabel('Expected Return')
+        ax.legend()
+        ax.grid()
+        plt.show()
+
@@ -0,0 +1,192 @@
+"""
+@author: Adam Diamant (2025)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from gurobipy import GRB
+import gurobipy as gb
+import numpy as np
+import time
+
+# The number of threads that solve scenario subproblems in parallel. Gurobi
+# releases the GIL while it optimizes so the subproblems run on separate cores.
+WORKERS = 4
+
+# A two-stage model is described by the same three pieces that the
+# stochastic scripts (Crop Allocation, Cargo Plane) are written with:
+#
+#   first_stage(model) -> (x, cost)
+#       adds the first-stage variables x (a list/tupledict) with their
+#       constraints and returns them along with the first-stage objective
+#   recourse(model, x, data) -> expression
+#       adds the recourse variables and constraints for one scenario and
+#       returns the second-stage objective for that scenario
+#   scenarios = [(probability, data), ...]
+#
+# The sense (GRB.MINIMIZE or GRB.MAXIMIZE) applies to cost + recourse.
+
+# A group of scenario subproblems that live in their own Gurobi environment
+# (environments are not thread-safe so every worker needs its own)
+class ScenarioShard:
+
+    def __init__(self, first_stage, recourse, scenarios, sense):
+        self.env = gb.Env(params={'OutputFlag': 0, 'Threads': 1})
+        self.models = []
+        for probability, data in scenarios:
+            model = gb.Model("Scenario Subproblem", env=self.env)
+            x, cost = first_stage(model)
+            x = list(x.values()) if isinstance(x, dict) else list(x)
+            objective = cost + recourse(model, x, data)
+            model.setObjective(objective, sense)
+            model.update()
+            c = np.array([v.Obj for v in x])
+            self.models.append((model, x, c, objective))
+
+        # The rho of the proximal term currently in the objectives
+        self.rho = 0.0
+
+    # Solve each subproblem with the penalty w'x + rho/2 ||x - xbar||^2. The
+    # quadratic term rho/2 x'x is only rebuilt when rho changes; otherwise
+    # each iteration just updates the linear coefficients of x.
+    def solve(self, w, xbar, sense, rho):
+        if rho != self.rho:
+            for model, x, c, objective in self.models:
+                model.setObjective(objective + sense*rho/2.0*gb.quicksum(v*v for v in x), sense)
+            self.rho = rho
+
+        solutions = []
+        objectives = []
+        for k, (model, x, c, objective) in enumerate(self.models):
+            coefficients = c + sense*(w[k] - rho*xbar)
+            model.setAttr('Obj', x, coefficients.tolist())
+            model.optimize()
+            if model.status != GRB.OPTIMAL:
+                raise RuntimeError("Scenario subproblem ended with status %d" % model.status)
+            solutions.append(model.getAttr('X', x))
+            objectives.append(objective.getValue())
+        return np.array(solutions), np.array(objectives)
+
+    def dispose(self):
+        for model, _, _, _ in self.models:
+            model.dispose()
+        self.env.dispose()
+
+# Progressive Hedging: solve every scenario separately and drive the
+# first-stage decisions together by penalizing deviations from their average
+def progressive_hedging(first_stage, recourse, scenarios, sense=GRB.MINIMIZE, rho=1.0,
+                        tolerance=1e-4, max_iterations=500, time_limit=60.0, workers=WORKERS):
+
+    start = time.time()
+    probabilities = np.array([p for p, _ in scenarios], dtype=float)
+    probabilities = probabilities/probabilities.sum()
+
+    # Split the scenarios into contiguous shards, one per worker
+    bounds = np.linspace(0, len(scenarios), min(workers, len(scenarios)) + 1).astype(int)
+    slices = [slice(bounds[k], bounds[k+1]) for k in range(len(bounds) - 1)]
+
+    with ThreadPoolExecutor(max_workers=len(slices)) as pool:
+        shards = list(pool.map(lambda s: ScenarioShard(first_stage, recourse, scenarios[s], sense), slices))
+
+        # Solve all the subproblems in parallel for the given multipliers
+        def solve_all(w, xbar, rho):
+            results = list(pool.map(lambda k: shards[k].solve(w[slices[k]], xbar, sense, rho), range(len(shards))))
+            return np.vstack([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+        # Iteration 0: no penalties so each scenario is solved independently
+        n = len(shards[0].models[0][1])
+        w = np.zeros((len(scenarios), n))
+        x, objectives = solve_all(w, np.zeros(n), 0.0)
+        xbar = probabilities @ x
+        w = rho*(x - xbar)
+
+        # The convergence diagnostics recorded each iteration
+        history = []
+        status = "iteration limit"
+        for iteration in range(1, max_iterations + 1):
+            x, objectives = solve_all(w, xbar, rho)
+            xbar_new = probabilities @ x
+            w += rho*(x - xbar_new)
+
+            # Primal residual (nonanticipativity violation) and dual residual (movement of xbar)
+            primal = probabilities @ np.linalg.norm(x - xbar_new, axis=1)
+            dual = rho*np.linalg.norm(xbar_new - xbar)
+            xbar = xbar_new
+            history.append({'iteration': iteration, 'objective': probabilities @ objectives,
+                            'primal residual': primal, 'dual residual': dual,
+                            'elapsed': time.time() - start})
+
+            if primal < tolerance and dual < tolerance:
+                status = "converged"
+                break
+            if time.time() - start > time_limit:
+                status = "time limit"
+                break
+
+        for shard in shards:
+            shard.dispose()
+
+    return xbar, history, status
+
+# Print the convergence diagnostics
+def report(name, xbar, history, status):
+    print("\n--- %s ---" % name)
+    print("%9s %15s %15s %15s %9s" % ("Iteration", "Objective", "Primal Resid.", "Dual Resid.", "Time (s)"))
+    for h in history[:5] + history[5:][-5:]:
+        print("%9d %15.2f %15.6f %15.6f %9.2f" % (h['iteration'], h['objective'], h['primal residual'], h['dual residual'], h['elapsed']))
+    print("Status: ", status)
+    print("First-stage decisions: ", ['%.2f' % v for v in xbar])
+
+
+# ------------------------------------------------------
+# Crop Allocation (three yield scenarios)
+
+# Selling prices
+sell = [220, 260, 55, 26]
+purchase = [264, 312]
+
+def crop_first_stage(model):
+    x = model.addVars(3, lb=0, vtype=GRB.CONTINUOUS, name="Crops")
+    model.addConstr(x[0] + x[1] + x[2] <= 500, "Land Capacity")
+    return x, 0
+
+def crop_recourse(model, x, yields):
+    y = model.addVars(2, lb=0, vtype=GRB.CONTINUOUS, name="Purchased")
+    z = model.addVars(4, lb=0, vtype=GRB.CONTINUOUS, name="Sold")
+    model.addConstr(yields[0]*x[0] + y[0] - z[0] >= 200, "Oats")
+    model.addConstr(yields[1]*x[1] + y[1] - z[1] >= 260, "Maize")
+    model.addConstr(z[2] <= 7000, "Quota")
+    model.addConstr(z[2] + z[3] == yields[2]*x[2], "Soybean")
+    return gb.quicksum(z[i]*sell[i] for i in range(4)) - gb.quicksum(y[i]*purchase[i] for i in range(2))
+
+crop_scenarios = [(0.30, (4.25, 3.0, 20.0)), (0.25, (5.1, 3.6, 24.0)), (0.45, (3.4, 2.4, 16.0))]
+
+# ------------------------------------------------------
+# Cargo Plane (seven demand scenarios)
+
+def cargo_first_stage(model):
+    x = model.addVars(3, lb=0, vtype=GRB.CONTINUOUS, name="Tons")
+    model.addConstr(2*x[0] + 1.5*x[1] + x[2] <= 102, "Capacity")
+    return x, 0
+
+def cargo_recourse(model, x, demand):
+    y = model.addVars(3, lb=0, ub=list(demand), vtype=GRB.CONTINUOUS, name="Recourse")
+    model.addConstrs((y[i] <= x[i] for i in range(3)), "Capacity")
+    return 10*(4*y[0] + 3*y[1] + y[2])
+
+p = [0.05, 0.15, 0.10, 0.25, 0.30, 0.10, 0.05]
+frozen = [0, 0, 4, 8, 12, 16, 20]
+refrigerated = [8, 16, 24, 32, 40, 48, 56]
+regular = [100, 90, 80, 70, 60, 50, 40]
+cargo_scenarios = [(p[n], (frozen[n], refrigerated[n], regular[n])) for n in range(len(p))]
+
+
+if __name__ == "__main__":
+
+    # The extensive form of the crop problem has an objective of 369949.33
+    xbar, history, status = progressive_hedging(crop_first_stage, crop_recourse, crop_scenarios,
+                                                sense=GRB.MAXIMIZE, rho=2.0, tolerance=1e-3)
+    report("Crop Allocation", xbar, history, status)
+
+    xbar, history, status = progressive_hedging(cargo_first_stage, cargo_recourse, cargo_scenarios,
+                                                sense=GRB.MAXIMIZE, rho=5.0, tolerance=1e-3)
+    report("Cargo Plane", xbar, history, status)
@@ -5,10 +5,47 @@
 import random
 import math
 import numpy
+from scipy.special import ndtr, ndtri
+from scipy.stats import poisson
+from functools import partial
+from montecarlo import randomized_qmc, critical_values, parallel_monte_carlo
 
 # Should we calculate and report the SE?
 CALCULATE_SE = True
 
+# Should we use the vectorized simulation? The trials are processed in chunks
+# of CHUNK so that memory stays bounded for any number of trials.
+VECTORIZED = True
+CHUNK = 10000
+
+# Which estimator of the probability should be used?
+#   'crude'        the simulation above (an indicator per trial)
+#   'conditional'  the sales that reach the target on their own are handled exactly
+#   'stratified'   'conditional' with the remaining sales count stratified
+#   'importance'   importance sampling with cross-entropy tilting
+ESTIMATOR = 'crude'
+
+# The sales process: RATE sales per week, each lognormal(MU, SIGMA)
+RATE = 5
+MU = 6
+SIGMA = 3
+
+# Which draws should the 'crude' and 'conditional' estimators use? 'random'
+# is pseudo-random; 'sobol' and 'halton' are scrambled low-discrepancy
+# sequences, run as REPLICATES independent replicates of QMC_POINTS trials
+SAMPLER = 'random'
+REPLICATES = 16
+QMC_POINTS = 2**13
+
+# Should the 'crude' or 'conditional' estimator run on WORKERS processes?
+# Batches of BATCH trials are simulated until the 95% confidence interval
+# half-width drops below PRECISION (or MAX_TRIALS trials have been run).
+PARALLEL = False
+WORKERS = 4
+BATCH = 10**6
+PRECISION = 0.0005
+MAX_TRIALS = 10**8
+
 def simulate_monthly_sales(selling_weeks_left, target, trials=2000):
     
     # A metric to track in how many trials the target is achieved
@@ -23,11 +60,11 @@ def simulate_monthly_sales(selling_weeks_left, target, trials=2000):
         for week in range(selling_weeks_left):
             
             # The number of sales per week
-            number_of_sales = numpy.random.poisson(5)
+            number_of_sales = numpy.random.poisson(RATE)
             
             # The size of each sale 
             for sales in range(number_of_sales):            
-                sales_cumulative += random.lognormvariate(6, 3)       # Generates a lognormal random variate           
+                sales_cumulative += random.lognormvariate(MU, SIGMA)       # Generates a lognormal random variate           
         
         # After the remaining selling horizon, is the target achieved?
         if (sales_cumulative >= target):
@@ -36,17 +73,335 @@ def simulate_monthly_sales(selling_weeks_left, target, trials=2000):
     # Return the probability that the target is achieved over all trials
     return target_achieved/trials
 
-trials = 100000
-prob = simulate_monthly_sales(9, 187000, trials)
-print("The probability is %2.3f." % prob)    
+# The same simulation with NumPy. A sum of independent Poisson(RATE) weekly
+# counts is Poisson(RATE*weeks), so each trial needs a single count. All the
+# lognormal sale sizes of a chunk are drawn in one flat array (in float32,
+# exp(MU + SIGMA*Z) computed in place) and np.add.reduceat adds up the sales that
+# belong to each trial. Chunks keep the memory bounded for any number of trials.
+# If a sampler is given, the draws come from it instead of rng.
+def simulate_monthly_sales_vectorized(selling_weeks_left, target, trials=2000, chunk=CHUNK, rng=None, sampler=None):
+
+    rng = numpy.random.default_rng() if rng is None else rng
+    target_achieved = 0
+
+    for start in range(0, trials, chunk):
+        size = min(chunk, trials - start)
+        if sampler is not None:
+            _, log_sales, trial = sampled_log_sales(size, RATE*selling_weeks_left, sampler)
+            sales_cumulative = numpy.bincount(trial, weights=numpy.exp(log_sales), minlength=size)
+        else:
+            sales_cumulative = monthly_sales_totals(selling_weeks_left, size, rng)
+        target_achieved += numpy.count_nonzero(sales_cumulative >= target)
+
+    # Return the probability that the target is achieved over all trials
+    return target_achieved/trials
+
+# The total sales ($) of each of size trials
+def monthly_sales_totals(selling_weeks_left, size, rng):
+
+    # The number of sales in each trial over the remaining selling weeks
+    number_of_sales = rng.poisson(RATE*selling_weeks_left, size=size)
+    total = int(number_of_sales.sum())
+    if total == 0:
+        return numpy.zeros(size)
+
+    # The size of every sale, followed by a 0 sentinel (see sales_by_trial)
+    sales = numpy.zeros(total + 1, dtype=numpy.float32)
+    sizes = sales[:total]
+    rng.standard_normal(dtype=numpy.float32, out=sizes)
+    sizes *= SIGMA
+    sizes += MU
+    numpy.exp(sizes, out=sizes)
+    return sales_by_trial(sales, number_of_sales)
+
+# Add up the sales of each trial. The sales are ordered trial by trial and
+# followed by a 0 sentinel so that every trial has a valid reduceat start
+# index: trials without sales at the end start at the sentinel, the ones in
+# between would get the next trial's first sale and are zeroed out afterwards.
+def sales_by_trial(sales, number_of_sales):
+    first_sale = numpy.cumsum(number_of_sales) - number_of_sales
+    sales_cumulative = numpy.add.reduceat(sales, first_sale, dtype=numpy.float64)
+    sales_cumulative[number_of_sales == 0] = 0
+    return sales_cumulative
+
+# Check sales_by_trial against a plain per-trial sum, including chunks that
+# end with trials without any sales
+def check_sales_by_trial(rng=None):
+    rng = numpy.random.default_rng() if rng is None else rng
+    for number_of_sales in ([2, 0], [0, 3, 0, 1, 0, 0], [0, 0], [4, 1, 2]):
+        number_of_sales = numpy.array(number_of_sales)
+        sales = numpy.append(rng.random(number_of_sales.sum()), 0.0)
+        expected = [part.sum() for part in numpy.split(sales[:-1], numpy.cumsum(number_of_sales)[:-1])]
+        if not numpy.allclose(sales_by_trial(sales, number_of_sales), expected):
+            raise AssertionError("The sales of the trials %s are not added up correctly" % number_of_sales)
+
+# The probability that a single lognormal(mean, SIGMA) sale is smaller than x
+def sale_cdf(x, mean=None):
+    mean = MU if mean is None else mean
+    x = numpy.asarray(x, dtype=float)
+    return numpy.where(x > 0, ndtr((numpy.log(numpy.maximum(x, 1e-300)) - mean)/SIGMA), 0.0)
+
+# Draw the log of every sale for the given number of sales in each trial.
+# The sales are lognormal(mean, SIGMA), conditioned to be below upper if it
+# is given (by inverting the truncated CDF). Also returns the trial of each sale.
+def draw_log_sales(number_of_sales, rng, mean=None, upper=None):
+    mean = MU if mean is None else mean
+    total = int(number_of_sales.sum())
+    if upper is None:
+        log_sales = mean + SIGMA*rng.standard_normal(total)
+    else:
+        log_sales = mean + SIGMA*ndtri(rng.random(total)*sale_cdf(upper, mean))
+    trial = numpy.repeat(numpy.arange(len(number_of_sales)), number_of_sales)
+    return log_sales, trial
+
+# The same draws for size trials from a sampler (see montecarlo.py). Every
+# trial is one point: its first coordinate gives the Poisson count and the
+# following ones the sale sizes. The count is capped where the Poisson tail
+# probability drops below 1e-12 so that the points have a fixed dimension.
+def sampled_log_sales(size, rate, sampler, upper=None):
+    most = int(poisson.isf(1e-12, rate)) + 1
+    u = sampler.uniform(size, most + 1)
+    number_of_sales = numpy.minimum(poisson.ppf(u[:, 0], rate), most).astype(int)
+    mask = numpy.arange(most) < number_of_sales[:, None]
+    scale = 1.0 if upper is None else sale_cdf(upper)
+    log_sales = MU + SIGMA*ndtri(u[:, 1:][mask]*scale)
+    return number_of_sales, log_sales, numpy.nonzero(mask)[0]
+
+# Conditional Monte Carlo. The sales at or above the target form a Poisson
+# process of their own, so the probability that at least one of them occurs
+# is known exactly: 1 - exp(-rate*P(sale >= target)). Only the event that the
+# remaining (smaller) sales add up to the target has to be simulated, and
+# these sales form an independent Poisson process with truncated sizes.
+# With stratified=True the number of smaller sales is stratified: trial i
+# uses the Poisson quantile of a uniform drawn from [i/trials, (i+1)/trials).
+# If a sampler is given (without stratification), the draws come from it.
+def conditional_monte_carlo(selling_weeks_left, target, trials=2000, stratified=False, chunk=CHUNK, rng=None, sampler=None):
+
+    rng = numpy.random.default_rng() if rng is None else rng
+    if stratified and sampler is not None:
+        raise ValueError("The stratified estimator draws its own sales counts")
+    if target <= 0:
+        return 1.0, 0.0
+
+    rate = RATE*selling_weeks_left
+    below = float(sale_cdf(target))
+    reached = -math.expm1(-rate*(1 - below))
+
+    # The number of trials and of residual hits in each stratum
+    # (one stratum per number of sales; a single stratum for plain sampling)
+    hits = numpy.zeros(1)
+    count = numpy.zeros(1)
+
+    for start in range(0, trials, chunk):
+        size = min(chunk, trials - start)
+
+        # The number of sales below the target in each trial
+        if stratified:
+            uniforms = (start + numpy.arange(size) + rng.random(size))/trials
+            number_of_sales = poisson.ppf(uniforms, rate*below).astype(int)
+            log_sales, trial = draw_log_sales(number_of_sales, rng, upper=target)
+        elif sampler is not None:
+            number_of_sales, log_sales, trial = sampled_log_sales(size, rate*below, sampler, upper=target)
+        else:
+            number_of_sales = rng.poisson(rate*below, size=size)
+            log_sales, trial = draw_log_sales(number_of_sales, rng, upper=target)
+
+        sales_cumulative = numpy.bincount(trial, weights=numpy.exp(log_sales), minlength=size)
+        achieved = (sales_cumulative >= target).astype(float)
+
+        stratum = number_of_sales if stratified else numpy.zeros(size, dtype=int)
+        strata = max(len(count), stratum.max() + 1)
+        hits = numpy.pad(hits, (0, strata - len(hits))) + numpy.bincount(stratum, weights=achieved, minlength=strata)
+        count = numpy.pad(count, (0, strata - len(count))) + numpy.bincount(stratum, minlength=strata)
+
+    # The indicator is 0/1 so its variance within a stratum is q(1 - q).
+    # With proportional allocation the variance of the mean is sum_h (n_h/n) var_h / n.
+    occupied = count > 0
+    q = hits[occupied]/count[occupied]
+    weights = count[occupied]/trials
+    residual = weights @ q
+    variance = weights @ (q*(1 - q)*count[occupied]/numpy.maximum(count[occupied] - 1, 1))
+
+    # If the smaller sales never (or always) reach the target, the sample
+    # variance is zero although the residual is not known exactly: use the
+    # variance of the adjusted proportion (hits + 1)/(trials + 2) instead
+    if hits.sum() in (0, trials):
+        adjusted = (hits.sum() + 1)/(trials + 2)
+        variance = adjusted*(1 - adjusted)
+
+    prob = reached + (1 - reached)*residual
+    standardError = (1 - reached)*math.sqrt(variance/trials)
+    return prob, standardError
+
+# The outcome of every trial for the parallel runner (see montecarlo.py),
+# whose mean is the estimate: the indicator that the target is achieved
+# ('crude') or the conditional estimate of each trial ('conditional')
+def trial_outcomes(rng, trials, estimator='crude', selling_weeks_left=9, target=187000, chunk=CHUNK):
+
+    rate = RATE*selling_weeks_left
+    below = float(sale_cdf(target))
+    reached = -math.expm1(-rate*(1 - below))
+
+    outcomes = numpy.empty(trials)
+    for start in range(0, trials, chunk):
+        size = min(chunk, trials - start)
+        if estimator == 'crude':
+            outcomes[start:start + size] = monthly_sales_totals(selling_weeks_left, size, rng) >= target
+        elif estimator == 'conditional':
+            number_of_sales = rng.poisson(rate*below, size=size)
+            log_sales, trial = draw_log_sales(number_of_sales, rng, upper=target)
+            achieved = numpy.bincount(trial, weights=numpy.exp(log_sales), minlength=size) >= target
+            outcomes[start:start + size] = reached + (1 - reached)*achieved
+        else:
+            raise ValueError("The parallel runner supports the 'crude' and 'conditional' estimators")
+    return outcomes
+
+# The per-trial log likelihood ratio of the nominal process (RATE sales per
+# week, lognormal(MU, SIGMA) sizes) to a tilted one with the given Poisson
+# rate and lognormal parameters. The tilted process stays in the same families
+# so the ratio only depends on the count and the log sale sizes.
+def log_likelihood_ratio(number_of_sales, log_sales, trial, rate, tilt):
+    tilted_rate, tilted_mean, tilted_sigma = tilt
+    shift = (((log_sales - tilted_mean)/tilted_sigma)**2 - ((log_sales - MU)/SIGMA)**2)/2 + math.log(tilted_sigma/SIGMA)
+    return (number_of_sales*math.log(rate/tilted_rate) + tilted_rate - rate
+            + numpy.bincount(trial, weights=shift, minlength=len(number_of_sales)))
+
+# Draw trials from the tilted process and return the total sales and likelihood ratios
+def tilted_trials(size, rate, tilt, rng):
+    tilted_rate, tilted_mean, tilted_sigma = tilt
+    number_of_sales = rng.poisson(tilted_rate, size=size)
+    trial = numpy.repeat(numpy.arange(size), number_of_sales)
+    log_sales = tilted_mean + tilted_sigma*rng.standard_normal(len(trial))
+    sales_cumulative = numpy.bincount(trial, weights=numpy.exp(log_sales), minlength=size)
+    likelihood = numpy.exp(log_likelihood_ratio(number_of_sales, log_sales, trial, rate, tilt))
+    return number_of_sales, log_sales, trial, sales_cumulative, likelihood
+
+# Choose the tilt with the (multilevel) cross-entropy method. The rarer of the
+# two events {sales >= target} and {sales < target} is the one that is tilted
+# towards; each iteration moves the level to the elite quantile of the pilot
+# sample until the target itself is reached.
+def cross_entropy_tilt(selling_weeks_left, target, pilot=20000, rarity=0.1, iterations=20, rng=None):
+
+    rng = numpy.random.default_rng() if rng is None else rng
+    rate = RATE*selling_weeks_left
+    tilt = (rate, MU, SIGMA)
+    upper = None
+
+    for iteration in range(iterations):
+        number_of_sales, log_sales, trial, sales_cumulative, likelihood = tilted_trials(pilot, rate, tilt, rng)
+        if upper is None:
+            upper = numpy.mean(sales_cumulative >= target) < 0.5
+
+        # The elite trials beyond the current level
+        if upper:
+            level = min(target, numpy.quantile(sales_cumulative, 1 - rarity))
+            elite = sales_cumulative >= level
+        else:
+            level = max(target, numpy.quantile(sales_cumulative, rarity))
+            elite = sales_cumulative <= level
+
+        # The likelihood-weighted estimates of the Poisson rate and of the
+        # mean and standard deviation of the log sale sizes
+        weight = likelihood*elite
+        sale_weight = weight[trial]
+        tilted_rate = weight @ number_of_sales/weight.sum()
+        tilted_mean = sale_weight @ log_sales/sale_weight.sum()
+        tilted_sigma = math.sqrt(sale_weight @ (log_sales - tilted_mean)**2/sale_weight.sum())
+        tilt = (tilted_rate, tilted_mean, tilted_sigma)
+        if level == target:
+            break
+
+    return upper, tilt
+
+# Importance sampling: simulate the tilted process and weight every trial by
+# its likelihood ratio. Also returns the effective sample size of the weights.
+def importance_sampling(selling_weeks_left, target, trials=2000, chunk=CHUNK, rng=None):
+
+    rng = numpy.random.default_rng() if rng is None else rng
+    rate = RATE*selling_weeks_left
+    upper, tilt = cross_entropy_tilt(selling_weeks_left, target, rng=rng)
+
+    # Running sums of the weighted indicator, its square and the weights
+    total = total_squared = weights = weights_squared = 0.0
+    for start in range(0, trials, chunk):
+        size = min(chunk, trials - start)
+        _, _, _, sales_cumulative, likelihood = tilted_trials(size, rate, tilt, rng)
+        event = sales_cumulative >= target if upper else sales_cumulative < target
+        estimate = likelihood*event
+        total += estimate.sum()
+        total_squared += estimate @ estimate
+        weights += likelihood.sum()
+        weights_squared += likelihood @ likelihood
+
+    mean = total/trials
+    standardError = math.sqrt(max(total_squared/trials - mean**2, 0.0)/(trials - 1))
+    prob = mean if upper else 1 - mean
+    return prob, standardError, weights**2/weights_squared
+
+# The standard error, effective sample size and confidence intervals. The
+# effective sample size is the number of crude trials with the same standard
+# error. dof is the degrees of freedom when the SE comes from RQMC replicates.
+def report(prob, standardError, dof=None):
+    z90, z95, z99 = critical_values(dof)
+    print(("The standard error is %2.3f." if standardError >= 0.0005 else "The standard error is %.3g.") % standardError)
+    if standardError > 0:
+        print("The effective sample size is %d." % (prob*(1 - prob)/standardError**2))
+    print("The 90%% confidence interval is (%2.3f, %2.3f)." % (prob -  z90*standardError , prob + z90*standardError))
+    print("The 95%% confidence interval is (%2.3f, %2.3f)." % (prob -  z95*standardError , prob + z95*standardError))
+    print("The 99%% confidence interval is (%2.3f, %2.3f)." % (prob -  z99*standardError , prob + z99*standardError))
+
+if __name__ == "__main__":
+
+    check_sales_by_trial()
+    trials = 100000
+    if PARALLEL:
+
+        # Independent SeedSequence streams per batch, merged with streaming statistics
+        statistics = parallel_monte_carlo(partial(trial_outcomes, estimator=ESTIMATOR), MAX_TRIALS, batch=BATCH,
+                                          workers=WORKERS, epsilon=PRECISION, seed=2025)
+        prob, standardError = statistics.mean, statistics.standard_error()
+        print("The probability is %2.3f (%d trials)." % (prob, statistics.count))
+
+        if CALCULATE_SE:
+            report(prob, standardError)
+
+    elif SAMPLER != 'random':
+
+        # Randomized QMC: every replicate estimates the probability from its own scrambled sequence
+        if ESTIMATOR == 'crude':
+            estimate = lambda sampler: simulate_monthly_sales_vectorized(9, 187000, QMC_POINTS, sampler=sampler)
+        elif ESTIMATOR == 'conditional':
+            estimate = lambda sampler: conditional_monte_carlo(9, 187000, QMC_POINTS, sampler=sampler)[0]
+        else:
+            raise ValueError("The %s estimator draws its own samples; use SAMPLER = 'random'" % ESTIMATOR)
+        prob, standardError, _ = randomized_qmc(estimate, SAMPLER, REPLICATES)
+        print("The probability is %2.3f." % prob)
+
+        if CALCULATE_SE:
+            report(prob, standardError, dof=REPLICATES - 1)
+
+    elif ESTIMATOR == 'crude':
+        if VECTORIZED:
+            prob = simulate_monthly_sales_vectorized(9, 187000, trials)
+        else:
+            prob = simulate_monthly_sales(9, 187000, trials)
+        print("The probability is %2.3f." % prob)    
+
+        if CALCULATE_SE:
+            # Calculate the standard error over all trials and print the result 
+            standardDeviation = math.sqrt(prob * (1-prob))
+            standardError = standardDeviation/math.sqrt(trials)
+            print("The standard deviation is %2.3f." % standardDeviation)
+            report(prob, standardError)
 
+    else:
+        if ESTIMATOR == 'importance':
+            prob, standardError, weightsESS = importance_sampling(9, 187000, trials)
+        else:
+            prob, standardError = conditional_monte_carlo(9, 187000, trials, stratified=(ESTIMATOR == 'stratified'))
+        print("The probability is %2.3f." % prob)
 
-if CALCULATE_SE:
-    # Calculate the standard error over all trials and print the result 
-    standardDeviation = math.sqrt(prob * (1-prob))
-    standardError = standardDeviation/math.sqrt(trials)
-    print("The standard deviation is %2.3f." % standardDeviation)
-    print("The standard error is %2.3f." % standardError)
-    print("The 90%% confidence interval is (%2.3f, %2.3f)." % (prob -  1.645*standardError , prob + 1.645*standardError))
-    print("The 95%% confidence interval is (%2.3f, %2.3f)." % (prob -  1.96*standardError , prob + 1.96*standardError))
-    print("The 99%% confidence interval is (%2.3f, %2.3f)." % (prob -  2.575*standardError , prob + 2.575*standardError))
\ No newline at end of file
+        if CALCULATE_SE:
+            report(prob, standardError)
+            if ESTIMATOR == 'importance':
+                print("The effective sample size of the importance weights is %d." % weightsESS)
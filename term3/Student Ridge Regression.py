@@ -5,66 +5,394 @@
 
 import gurobipy as gp
 from gurobipy import GRB
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib.pyplot as plt
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import brentq, nnls
 import pandas as pd
 import numpy as np
 
-# Load the training data
-train_file = "https://github.com/EthanRosehart/schulich_data_science/raw/refs/heads/main/term3/Student%20Ridge%20Regression%20-%20Training%20Data.xlsx"
-train_data = pd.read_excel(train_file)
+# Which regression should we fit? 'ridge' bounds ||beta||^2 by t, 'lasso' bounds
+# ||beta||_1 by L1_BUDGET and 'subset' keeps at most SUBSET_SIZE nonzero betas.
+MODEL = 'ridge'
+L1_BUDGET = 1.0
+SUBSET_SIZE = 10
 
-# Define the features and outcome columns
-y_train = train_data['Grade'].values                 # outcomes
-X_train = train_data.drop(columns=['Grade']).values  # feature matrix
-N, J = X_train.shape                                 # number of training instances (N) and features (J)
+# How should best subset link beta to the selection binaries? 'indicator' uses
+# indicator constraints; 'big-m' uses L z <= beta <= U z with bounds that every
+# optimal solution provably satisfies (see big_m_bounds).
+SUBSET_LINK = 'indicator'
+SUBSET_TIME_LIMIT = 60
 
-# Budget constraint for regularization
-t = 2 # Test different values - term too high - restricts learning - too low
+# Which solver should fit the ridge model? 'gurobi' builds the QCP, while 'svd'
+# and 'cholesky' solve the penalized least squares problem with linear algebra.
+SOLVER = 'svd'
 
-# Create a new Gurobi model
-model = gp.Model("Ridge Regression")
+# Should the Gurobi solution be computed as well to check the linear algebra path?
+COMPARE_SOLVERS = False
 
-# Add decision variables: alpha (scalar), beta (vector of length J), u_i (vector of length N), v_i (vector of length N)
-alpha = model.addVar(vtype=GRB.CONTINUOUS, name="alpha")
-beta = model.addVars(J, vtype=GRB.CONTINUOUS, name="beta")
+# The models keep alpha and beta nonnegative (the default variable bounds in
+# Gurobi). Set to False to fit every model with unrestricted coefficients.
+NONNEGATIVE = True
 
-# Set the objective function as the squared error between predicted and actual
-# model.addConstrs(predicted[i] ==  for i in range(N)) 
-objective = (1.0 / N) * gp.quicksum( (y_train[i] - alpha - gp.quicksum(beta[j] * X_train[i, j] for j in range(J)))**2 for i in range(N))
-model.setObjective(objective, GRB.MINIMIZE)
+# Should we sweep the budget t with K-fold cross-validation? Each fold is
+# handled by a worker process (1 = run the folds in this process).
+CROSS_VALIDATION = True
+BUDGETS = np.logspace(-3, 0.5, 50)
+FOLDS = 5
+WORKERS = 4
 
-# Regularization constraint
-budget = model.addConstr(gp.quicksum(beta[j]*beta[j] for j in range(J)) <= t)
+# Fit the ridge regression as a QCP in Gurobi
+def solve_ridge_gurobi(X, y, t, nonnegative=NONNEGATIVE):
+    N, J = X.shape
+    lb = 0.0 if nonnegative else -GRB.INFINITY
 
-# Optimize the model
-model.optimize()
+    # Create a new Gurobi model
+    model = gp.Model("Ridge Regression")
 
-# Extract the optimal values of alpha and beta
-alpha_opt = alpha.X
-beta_opt = np.array([beta[j].X for j in range(J)])
-mean_grade = np.mean(y_train)
+    # Add decision variables: alpha (scalar), beta (vector of length J)
+    alpha = model.addVar(lb=lb, vtype=GRB.CONTINUOUS, name="alpha")
+    beta = model.addVars(J, lb=lb, vtype=GRB.CONTINUOUS, name="beta")
 
-print(f"Optimal alpha: {alpha_opt}")
-print(f"Optimal beta: {beta_opt}")
+    # Set the objective function as the squared error between predicted and actual
+    # model.addConstrs(predicted[i] ==  for i in range(N))
+    objective = (1.0 / N) * gp.quicksum( (y[i] - alpha - gp.quicksum(beta[j] * X[i, j] for j in range(J)))**2 for i in range(N))
+    model.setObjective(objective, GRB.MINIMIZE)
 
-lhs = sum(beta[j].X ** 2 for j in range(J))
-print(f'Budget constraint slack: {t - lhs}')
+    # Regularization constraint
+    budget = model.addConstr(gp.quicksum(beta[j]*beta[j] for j in range(J)) <= t)
 
-# Load the testing data
-test_file = "https://github.com/EthanRosehart/schulich_data_science/raw/refs/heads/main/term3/Student%20Ridge%20Regression%20-%20Testing%20Data.xlsx"
-test_data = pd.read_excel(test_file)
+    # Optimize the model
+    model.optimize()
 
-# Define the features and outcome columns for testing data
-y_test = test_data['Grade'].values  # outcomes
-X_test = test_data.drop(columns=['Grade']).values  # feature matrix
+    # Extract the optimal values of alpha and beta
+    return alpha.X, np.array([beta[j].X for j in range(J)])
 
-# Predict outcomes for the testing data
-y_pred = alpha_opt + X_test.dot(beta_opt)
+# Build the least squares objective from the centered Gram matrix. The
+# intercept is recovered as mean(y) - mean(X) @ beta, so the model has J
+# variables and J^2 quadratic terms however many observations there are.
+# With nonnegative=True, beta >= 0 and the recovered intercept is kept >= 0.
+def build_least_squares_model(X, y, name, nonnegative=NONNEGATIVE):
+    N, J = X.shape
+    x_mean, y_mean = X.mean(axis=0), y.mean()
+    centered, outcome = X - x_mean, y - y_mean
 
-# Calculate Mean Absolute Deviation (MAD) and Mean Squared Error (MSE)
-mse = np.mean((y_test - y_pred) ** 2)
+    model = gp.Model(name)
+    beta = model.addMVar(J, lb=0.0 if nonnegative else -GRB.INFINITY, vtype=GRB.CONTINUOUS, name="beta")
+    model.setObjective((beta @ (centered.T @ centered) @ beta - 2*(outcome @ centered) @ beta + outcome @ outcome)/N, GRB.MINIMIZE)
+    if nonnegative:
+        model.addConstr(x_mean @ beta <= y_mean, "Nonnegative Intercept")
+    return model, beta, x_mean, y_mean
 
-# Mean Squared Error (MSE) on benchmark
-mse_bench = np.mean((y_test - mean_grade) ** 2)
+# LASSO: the L1 budget is linear with u >= |beta|
+def solve_lasso_gurobi(X, y, budget, nonnegative=NONNEGATIVE):
+    model, beta, x_mean, y_mean = build_least_squares_model(X, y, "LASSO Regression", nonnegative)
+    u = model.addMVar(X.shape[1], lb=0, vtype=GRB.CONTINUOUS, name="u")
+    model.addConstr(u >= beta, "Positive Part")
+    model.addConstr(u >= -beta, "Negative Part")
+    model.addConstr(u.sum() <= budget, "L1 Budget")
+    model.optimize()
+    return y_mean - x_mean @ beta.X, beta.X
+
+# Refit least squares on the k largest coefficients of another solution
+# (ridge or LASSO) to get a feasible warm start for best subset selection
+# (nonnegative least squares when the coefficients are kept nonnegative)
+def subset_warm_start(X, y, beta, k, nonnegative=NONNEGATIVE):
+    support = np.sort(np.argsort(np.abs(beta))[::-1][:k])
+    centered = X - X.mean(axis=0)
+    start = np.zeros(X.shape[1])
+    if nonnegative:
+        start[support] = nnls(centered[:, support], y - y.mean(), maxiter=50*k)[0]
+    else:
+        start[support] = np.linalg.lstsq(centered[:, support], y - y.mean(), rcond=None)[0]
+    return start
+
+# Valid big-M bounds for best subset. An optimal solution fits at least as
+# well as the warm start, RSS(beta) <= RSS(start), so it lies in the ellipsoid
+#     (beta - b)' G (beta - b) <= RSS(start) - RSS(b)
+# around the least squares solution b on all the features (G = Xc'Xc). The
+# ellipsoid extends to b_j +/- sqrt(delta (G^-1)_jj) along coefficient j, and
+# these bounds (widened to include 0) hold for every optimal solution.
+# With nonnegative=True the lower bounds are 0. Returns None when G is
+# singular (the ellipsoid is unbounded) or the warm start is infeasible.
+def big_m_bounds(X, y, start, nonnegative=NONNEGATIVE):
+    centered, outcome = X - X.mean(axis=0), y - y.mean()
+    if nonnegative and (np.any(start < 0) or X.mean(axis=0) @ start > y.mean()):
+        return None
+    gram = centered.T @ centered
+    eigenvalues = np.linalg.eigvalsh(gram)
+    if eigenvalues[0] <= 1e-10*eigenvalues[-1]:
+        return None
+    b = np.linalg.solve(gram, centered.T @ outcome)
+    delta = np.sum((outcome - centered @ start)**2) - np.sum((outcome - centered @ b)**2)
+    radius = np.sqrt(max(delta, 0.0)*(1 + 1e-9)*np.diag(np.linalg.inv(gram))) + 1e-9
+    lower = np.zeros_like(b) if nonnegative else np.minimum(b - radius, 0.0)
+    return lower, np.maximum(b + radius, 0.0)
+
+# Best subset selection: at most k nonzero coefficients (a MIQP)
+def solve_best_subset_gurobi(X, y, k, start, link=SUBSET_LINK, time_limit=SUBSET_TIME_LIMIT, nonnegative=NONNEGATIVE):
+    J = X.shape[1]
+    model, beta, x_mean, y_mean = build_least_squares_model(X, y, "Best Subset Regression", nonnegative)
+    model.setParam('TimeLimit', time_limit)
+    z = model.addMVar(J, vtype=GRB.BINARY, name="z")
+    model.addConstr(z.sum() <= k, "Cardinality")
+
+    # Without valid bounds the link falls back to indicator constraints
+    bounds = big_m_bounds(X, y, start, nonnegative) if link == 'big-m' else None
+    if link == 'big-m' and bounds is None:
+        print("There are no valid big-M bounds (X'X is singular or the warm start is infeasible); using indicator constraints")
+
+    if bounds is not None:
+        lower, upper = bounds
+        beta.lb, beta.ub = lower, upper
+        model.addConstr(beta <= upper*z, "Upper Link")
+        model.addConstr(beta >= lower*z, "Lower Link")
+    else:
+        b, s = beta.tolist(), z.tolist()
+        for j in range(J):
+            model.addGenConstrIndicator(s[j], False, b[j] == 0, name=f"Link[{j}]")
+
+    # Warm start from the refitted ridge/LASSO support
+    beta.Start = start
+    z.Start = (start != 0).astype(float)
+    model.optimize()
+    return y_mean - x_mean @ beta.X, beta.X
+
+# Centering the data removes the intercept from the penalized problem:
+# alpha = mean(y) - mean(X) @ beta. The SVD of the centered features
+# X = U diag(s) V' is all we need to solve for beta for any budget t.
+# Directions with singular values below the rank tolerance of np.linalg.lstsq
+# are dropped (c = 0), which gives the minimum-norm solution for rank-deficient X.
+def ridge_decomposition(X, y):
+    x_mean, y_mean = X.mean(axis=0), y.mean()
+    U, s, Vt = np.linalg.svd(X - x_mean, full_matrices=False)
+    c = U.T @ (y - y_mean)
+    c[s <= s.max()*max(X.shape)*np.finfo(float).eps] = 0
+    return x_mean, y_mean, s, Vt, c
+
+# The penalized solution is beta(lam) = V diag(s/(s^2 + lam)) U'y, and its
+# squared norm decreases in lam. The budget ||beta||^2 <= t is met by lam = 0
+# (least squares) or by the lam where the squared norm equals t.
+# An upper bound on lam (such as the multiplier of a smaller budget) narrows the search.
+def ridge_multiplier(s, c, t, upper=None):
+    sc = s*c
+    def excess(lam):
+        return np.sum(np.divide(sc, s**2 + lam, out=np.zeros_like(sc), where=sc != 0)**2) - t
+    if np.all(s[sc != 0] > 1e-12*s.max()) and excess(0.0) <= 0:
+        return 0.0
+
+    # Even the smallest multiplier meets the budget (the minimum-norm least
+    # squares solution of rank-deficient data), so there is no root to find
+    if excess(1e-300) <= 0:
+        return 1e-300
+    if upper is None or upper <= 0 or excess(upper) > 0:
+        upper = np.sqrt(np.sum(sc**2)/t)
+    return brentq(excess, 1e-300, upper, xtol=1e-14, rtol=1e-12)
+
+def solve_ridge_svd(decomposition, t, upper=None):
+    x_mean, y_mean, s, Vt, c = decomposition
+    lam = ridge_multiplier(s, c, t, upper)
+    beta = Vt.T @ np.divide(s*c, s**2 + lam, out=np.zeros_like(s), where=s*c != 0)
+    return y_mean - x_mean @ beta, beta, lam
+
+# Solutions for many budgets from one SVD (one row of betas per budget). The
+# budgets are visited in increasing order so each multiplier search is
+# warm-started with the (larger) multiplier of the previous budget.
+def ridge_path(decomposition, budgets):
+    budgets = np.asarray(budgets, dtype=float)
+    alphas = np.empty(len(budgets))
+    betas = np.empty((len(budgets), len(decomposition[0])))
+    lam = None
+    for k in np.argsort(budgets):
+        alphas[k], betas[k], lam = solve_ridge_svd(decomposition, budgets[k], lam)
+    return alphas, betas
+
+# The same multiplier search, factoring X'X + lam*I with a Cholesky decomposition
+# at each step. Only the J x J Gram matrix is formed, which suits large N.
+def solve_ridge_cholesky(X, y, t):
+    x_mean, y_mean = X.mean(axis=0), y.mean()
+    centered = X - x_mean
+    gram = centered.T @ centered
+    rhs = centered.T @ (y - y_mean)
+
+    def beta(lam):
+        return cho_solve(cho_factor(gram + lam*np.eye(len(gram))), rhs)
+
+    # One factorization per step of the search
+    def excess(lam):
+        b = beta(lam)
+        return b @ b - t
+
+    try:
+        lam = 0.0 if excess(0.0) <= 0 else None
+    except np.linalg.LinAlgError:
+        lam = None
+    if lam is None:
+        # With singular X'X the smallest multiplier gives (nearly) the
+        # minimum-norm least squares solution; if it meets the budget there is no root
+        lower = 1e-12*np.trace(gram)
+        lam = lower if excess(lower) <= 0 else brentq(excess, lower, np.linalg.norm(rhs)/np.sqrt(t), xtol=1e-14, rtol=1e-12)
+    b = beta(lam)
+    return y_mean - x_mean @ b, b
+
+# The ridge model with alpha, beta >= 0. For a multiplier lam the penalized
+# problem is a nonnegative least squares problem
+#     [1 X; 0 sqrt(lam) I] [alpha; beta] ~ [y; 0]
+# and ||beta(lam)||^2 still decreases in lam, so the budget is met by the
+# same kind of root search (on a bracket that is doubled until it holds).
+def solve_ridge_nnls(X, y, t):
+    N, J = X.shape
+    A = np.vstack((np.column_stack((np.ones(N), X)), np.zeros((J, J + 1))))
+    b = np.concatenate((y, np.zeros(J)))
+
+    def coefficients(lam):
+        A[N:, 1:] = np.sqrt(lam)*np.eye(J)
+        return nnls(A, b, maxiter=50*(J + 1))[0]
+
+    def excess(lam):
+        beta = coefficients(lam)[1:]
+        return beta @ beta - t
+
+    lam = 0.0
+    if excess(0.0) > 0:
+        upper = 1.0
+        while excess(upper) > 0:
+            upper *= 4
+        lam = brentq(excess, 0.0, upper, xtol=1e-14, rtol=1e-12)
+    solution = coefficients(lam)
+    return solution[0], solution[1:]
+
+# The linear algebra solvers drop the bounds of the Gurobi model. Their
+# solution is optimal for the bounded model if it respects alpha, beta >= 0;
+# otherwise the bounded model is solved with nonnegative least squares.
+def honor_bounds(X, y, t, alpha, beta, nonnegative=NONNEGATIVE):
+    if nonnegative and (alpha < 0 or np.any(beta < 0)):
+        return solve_ridge_nnls(X, y, t)
+    return alpha, beta
+
+# The ridge path for many budgets from one SVD, with the bounds honored
+def bounded_ridge_path(X, y, budgets, nonnegative=NONNEGATIVE):
+    alphas, betas = ridge_path(ridge_decomposition(X, y), budgets)
+    for k in range(len(budgets)):
+        alphas[k], betas[k] = honor_bounds(X, y, budgets[k], alphas[k], betas[k], nonnegative)
+    return alphas, betas
+
+# The validation error of every budget for one fold
+def fold_errors(X, y, validation, budgets):
+    train = np.ones(len(y), dtype=bool)
+    train[validation] = False
+    alphas, betas = bounded_ridge_path(X[train], y[train], budgets)
+    predictions = alphas[:, None] + betas @ X[validation].T
+    return np.mean((y[validation] - predictions)**2, axis=1)
+
+# K-fold cross-validation of the budget; the folds are solved in parallel
+def cross_validate(X, y, budgets, folds=FOLDS, workers=WORKERS, seed=2025):
+    parts = np.array_split(np.random.default_rng(seed).permutation(len(y)), folds)
+    arguments = ([X]*folds, [y]*folds, parts, [budgets]*folds)
+    if workers <= 1:
+        errors = np.array(list(map(fold_errors, *arguments)))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, folds)) as pool:
+            errors = np.array(list(pool.map(fold_errors, *arguments)))
+    return errors.mean(axis=0), errors.std(axis=0, ddof=1)/np.sqrt(folds)
+
+
+if __name__ == "__main__":
+
+    # Load the training data
+    train_file = "https://github.com/EthanRosehart/schulich_data_science/raw/refs/heads/main/term3/Student%20Ridge%20Regression%20-%20Training%20Data.xlsx"
+    train_data = pd.read_excel(train_file)
+
+    # Define the features and outcome columns
+    y_train = train_data['Grade'].values                 # outcomes
+    X_train = train_data.drop(columns=['Grade']).values  # feature matrix
+    N, J = X_train.shape                                 # number of training instances (N) and features (J)
+
+    # Budget constraint for regularization
+    t = 2 # Test different values - term too high - restricts learning - too low
+
+    # Fit the model with the chosen solver
+    if MODEL == 'lasso':
+        alpha_opt, beta_opt = solve_lasso_gurobi(X_train, y_train, L1_BUDGET)
+    elif MODEL == 'subset':
+        _, beta_lasso = solve_lasso_gurobi(X_train, y_train, L1_BUDGET)
+        _, beta_ridge = honor_bounds(X_train, y_train, t, *solve_ridge_svd(ridge_decomposition(X_train, y_train), t)[:2])
+
+        # Start from whichever refitted support fits the training data better
+        starts = [subset_warm_start(X_train, y_train, b, SUBSET_SIZE) for b in (beta_lasso, beta_ridge)]
+        errors = [np.mean((y_train - y_train.mean() - (X_train - X_train.mean(axis=0)) @ s)**2) for s in starts]
+        alpha_opt, beta_opt = solve_best_subset_gurobi(X_train, y_train, SUBSET_SIZE, starts[int(np.argmin(errors))])
+    elif SOLVER == 'gurobi':
+        alpha_opt, beta_opt = solve_ridge_gurobi(X_train, y_train, t)
+    elif SOLVER == 'cholesky':
+        alpha_opt, beta_opt = honor_bounds(X_train, y_train, t, *solve_ridge_cholesky(X_train, y_train, t))
+    else:
+        alpha_opt, beta_opt = honor_bounds(X_train, y_train, t, *solve_ridge_svd(ridge_decomposition(X_train, y_train), t)[:2])
+    mean_grade = np.mean(y_train)
+
+    print(f"Optimal alpha: {alpha_opt}")
+    print(f"Optimal beta: {beta_opt}")
+
+    if MODEL == 'lasso':
+        print(f'L1 budget constraint slack: {L1_BUDGET - np.abs(beta_opt).sum()}')
+    elif MODEL == 'subset':
+        print(f'Number of features selected: {np.count_nonzero(np.abs(beta_opt) > 1e-9)}')
+    else:
+        lhs = beta_opt @ beta_opt
+        print(f'Budget constraint slack: {t - lhs}')
+
+    # Check the solution against the Gurobi model
+    if COMPARE_SOLVERS and MODEL == 'ridge' and SOLVER != 'gurobi':
+        alpha_check, beta_check = solve_ridge_gurobi(X_train, y_train, t)
+        print(f"Largest difference from Gurobi: {max(abs(alpha_opt - alpha_check), np.abs(beta_opt - beta_check).max())}")
+
+    # Load the testing data
+    test_file = "https://github.com/EthanRosehart/schulich_data_science/raw/refs/heads/main/term3/Student%20Ridge%20Regression%20-%20Testing%20Data.xlsx"
+    test_data = pd.read_excel(test_file)
+
+    # Define the features and outcome columns for testing data
+    y_test = test_data['Grade'].values  # outcomes
+    X_test = test_data.drop(columns=['Grade']).values  # feature matrix
+
+    # Predict outcomes for the testing data
+    y_pred = alpha_opt + X_test.dot(beta_opt)
+
+    # Calculate Mean Absolute Deviation (MAD) and Mean Squared Error (MSE)
+    mse = np.mean((y_test - y_pred) ** 2)
+
+    # Mean Squared Error (MSE) on benchmark
+    mse_bench = np.mean((y_test - mean_grade) ** 2)
+
+    print(f"Mean Squared Error (MSE): {mse}")
+    print(f"Mean Squared Error (MSE) Benchmark: {mse_bench}")
+
+    # Did you want to sweep the budget with cross-validation?
+    if CROSS_VALIDATION:
+
+        # The cross-validated error and the test error along the whole path
+        cv_mse, cv_se = cross_validate(X_train, y_train, BUDGETS)
+        alphas, betas = bounded_ridge_path(X_train, y_train, BUDGETS)
+        test_mse = np.mean((y_test - (alphas[:, None] + betas @ X_test.T))**2, axis=1)
+
+        print(f"{'Budget t':>10} {'CV MSE':>10} {'CV SE':>10} {'Test MSE':>10}")
+        for k in range(len(BUDGETS)):
+            print(f"{BUDGETS[k]:10.4f} {cv_mse[k]:10.5f} {cv_se[k]:10.5f} {test_mse[k]:10.5f}")
+
+        best = np.argmin(cv_mse)
+        print(f"Best budget (CV): {BUDGETS[best]}")
+        print(f"Mean Squared Error (MSE) at best budget: {test_mse[best]}")
+        print(f"Mean Squared Error (MSE) Benchmark: {mse_bench}")
+
+        # Plot the error curves against the mean-grade benchmark
+        plt.figure(figsize=(8, 5))
+        plt.errorbar(BUDGETS, cv_mse, yerr=cv_se, marker='o', label=f"{FOLDS}-fold CV MSE")
+        plt.plot(BUDGETS, test_mse, marker='s', label="Test MSE")
+        plt.axhline(mse_bench, color='gray', linestyle='--', label="Mean Grade Benchmark")
+        plt.xscale('log')
+        plt.xlabel("Budget t")
+        plt.ylabel("Mean Squared Error")
+        plt.title("Ridge Regression Path")
+        plt.legend()
+        plt.grid(True)
+        plt.show()
 
-print(f"Mean Squared Error (MSE): {mse}")
-print(f"Mean Squared Error (MSE) Benchmark: {mse_bench}")
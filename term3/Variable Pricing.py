@@ -4,31 +4,185 @@
 
 from gurobipy import GRB
 import gurobipy as gb
+import numpy as np
+import pandas as pd
+import time
 
 # Should we implement a variable pricing scheme?
 isVariablePricing = True
 isInteger = False 
 
+# Should we also sweep the diversion coefficient, cost and price cap with the
+# closed-form (KKT) engine?
+PARAMETRIC = False
+
 # Linear price response functions (intercept, slope)
 response = [[3100, 62], [1900, 50], [1700, 40], [1710, 42], [2000, 53], [2500, 54], [3300, 60]]
 
+# The diversion coefficient, the unit cost and the bounds on prices and demand
+DIVERSION = 9
+COST = 19
+PRICE_CAP = 40
+DEMAND_CAP = 1100
+
+# The parameter grids of the sweep (every combination, with and without
+# variable pricing)
+DIVERSIONS = np.linspace(0, 20, 81)
+COSTS = np.linspace(10, 30, 81)
+PRICE_CAPS = [40, 44, 48, 52, 56]
+
+# Demand on day n is a[n] - b[n]*p[n] + diversion*sum_m (p[m] - p[n]), i.e.
+# d = a - M p with M = diag(b) + diversion*(7I - 11'). M is symmetric, so the
+# profit (p - c)'(a - M p) has gradient a + M c - 2M p. The function accepts
+# arrays of diversion coefficients and returns one matrix per coefficient.
+def demand_matrix(slopes, diversion):
+    days = len(slopes)
+    diversion = np.asarray(diversion, dtype=float)[..., None, None]
+    return np.diag(np.asarray(slopes, dtype=float)) + diversion*(days*np.eye(days) - 1)
+
+# The stationary prices of the profit for stacks of parameters. With uniform
+# pricing the prices are p = 1s, and the equality constraints are eliminated
+# by solving the KKT system in s alone (2*1'M1 s = 1'(a + M c)). M is
+# positive definite for nonnegative slopes and diversion, so this is the
+# optimum whenever no price or demand bound is active.
+def kkt_prices(intercepts, M, cost, variable=True):
+    days = M.shape[-1]
+    E = np.eye(days) if variable else np.ones((days, 1))
+    c = np.asarray(cost, dtype=float)[..., None]*np.ones(days)
+    rhs = E.T @ (np.asarray(intercepts, dtype=float) + (M @ c[..., None])[..., 0])[..., None]
+    return (E @ np.linalg.solve(2*E.T @ M @ E, rhs))[..., 0]
+
+# The fallback when a bound is active: the concave QP in prices with the
+# demand bounds as linear constraints
+def solve_pricing_qp(intercepts, M, cost, price_cap, demand_cap, variable=True):
+    days = len(intercepts)
+    a = np.asarray(intercepts, dtype=float)
+    c = np.full(days, float(cost))
+    qp = gb.Model("Variable Pricing QP")
+    qp.setParam('OutputFlag', 0)
+    p = qp.addMVar(days, lb=0, ub=price_cap, name="Price")
+    qp.setObjective(-p @ M @ p + (a + M @ c) @ p - c @ a, GRB.MAXIMIZE)
+    qp.addConstr(M @ p <= a, "Nonnegative Demand")
+    qp.addConstr(M @ p >= a - demand_cap, "Demand Cap")
+    if not variable:
+        qp.addConstr(p[:-1] == p[1:], "Equality Constraint")
+    qp.optimize()
+    if qp.status != GRB.OPTIMAL:
+        return np.full(days, np.nan)
+    return p.X
+
+# The bounds 0 <= p <= cap and 0 <= d <= demand cap as rows G p <= h, one
+# stack per case
+def bound_rows(intercepts, M, price_cap, demand_cap):
+    days = M.shape[-1]
+    a = np.asarray(intercepts, dtype=float)
+    identity = np.broadcast_to(np.eye(days), M.shape)
+    G = np.concatenate((-identity, identity, M, -M), axis=-2)
+    cap = np.asarray(price_cap, dtype=float)[..., None]*np.ones(days)
+    h = np.concatenate((np.zeros_like(cap), cap, np.broadcast_to(a, cap.shape), np.broadcast_to(demand_cap - a, cap.shape)), axis=-1)
+    return G, h
+
+# The bounded problem for stacks of cases by a batched active-set method.
+# Every iteration solves the KKT system of all cases at once, with the rows
+# in each case's working set held as equalities:
+#     [ H        G'       ] [ x ]   [ g     ]
+#     [ diag(w)G diag(1-w)] [ l ] = [ w*h   ]
+# where p = E x, H = 2E'ME and g = E'(a + M c). A case adds its most
+# violated bound or, once feasible, drops its most negative multiplier. The
+# cases that do not settle (or whose working set is singular) are flagged
+# as not optimal.
+def active_set_prices(intercepts, M, cost, price_cap, demand_cap, variable=True, iterations=50, tolerance=1e-7):
+    days = M.shape[-1]
+    E = np.eye(days) if variable else np.ones((days, 1))
+    c = np.asarray(cost, dtype=float)[..., None]*np.ones(days)
+    H = 2*E.T @ M @ E
+    g = (E.T @ (np.asarray(intercepts, dtype=float) + (M @ c[..., None])[..., 0])[..., None])[..., 0]
+    G, h = bound_rows(intercepts, M, price_cap, demand_cap)
+    G = G @ E
+    scale = np.linalg.norm(G, axis=-1)
+    rows, n = G.shape[-2], E.shape[1]
+
+    working = np.zeros(h.shape, dtype=bool)
+    x = np.full(g.shape, np.nan)
+    settled = np.zeros(len(h), dtype=bool)
+    optimal = np.zeros(len(h), dtype=bool)
+    for _ in range(iterations):
+        active = ~settled
+        w = working[active].astype(float)
+        kkt = np.zeros((active.sum(), n + rows, n + rows))
+        kkt[:, :n, :n] = H[active]
+        kkt[:, :n, n:] = np.swapaxes(G[active], -1, -2)
+        kkt[:, n:, :n] = w[..., None]*G[active]
+        kkt[:, n:, n:] = np.eye(rows)*(1 - w)[..., None]
+        rhs = np.concatenate((g[active], w*h[active]), axis=-1)
+
+        # A singular working set cannot be handled here
+        try:
+            regular = np.ones(len(kkt), dtype=bool)
+            solution = np.linalg.solve(kkt, rhs[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            regular = np.abs(np.linalg.det(kkt)) > 1e-12*np.abs(np.linalg.det(kkt[:, :n, :n]))
+            solution = np.full(rhs.shape, np.nan)
+            solution[regular] = np.linalg.solve(kkt[regular], rhs[regular][..., None])[..., 0]
+        index = np.flatnonzero(active)
+        index, solution = index[regular], solution[regular]
+        settled[np.flatnonzero(active)[~regular]] = True
+        x[index] = solution[:, :n]
+        multipliers = solution[:, n:]
+
+        violation = ((G[index] @ solution[:, :n, None])[..., 0] - h[index])/scale[index]
+        add = violation.max(axis=1) > tolerance
+        drop = ~add & (multipliers.min(axis=1) < -tolerance)
+        working[index[add], violation[add].argmax(axis=1)] = True
+        working[index[drop], multipliers[drop].argmin(axis=1)] = False
+        settled[index[~add & ~drop]] = True
+        optimal[index[~add & ~drop]] = True
+        if settled.all():
+            break
+
+    return x @ E.T, optimal, working.any(axis=1)
+
+# Solve every combination of the parameter grids. All cases go through the
+# batched active-set method at once; a case it cannot settle is re-solved as
+# a QP (infeasible cases end there with a NaN profit). Returns one row per
+# case with the optimal profit and how it was found ('KKT' when no bound is
+# active).
+def sweep_variable_pricing(response, diversions, costs, price_caps, demand_cap=DEMAND_CAP, variable=True):
+    a = np.array([r[0] for r in response], dtype=float)
+    slopes = [r[1] for r in response]
+    grid = np.array(np.meshgrid(diversions, costs, price_caps, indexing='ij')).reshape(3, -1)
+    diversion, cost, price_cap = grid
+
+    M = demand_matrix(slopes, diversion)
+    prices, converged, bounded = active_set_prices(a, M, cost, price_cap, demand_cap, variable)
+    for k in np.flatnonzero(~converged):
+        prices[k] = solve_pricing_qp(a, M[k], cost[k], price_cap[k], demand_cap, variable)
+    demand = a - (M @ prices[..., None])[..., 0]
+
+    return pd.DataFrame({
+        'Diversion': diversion, 'Cost': cost, 'Price Cap': price_cap, 'Variable': variable,
+        'Profit': ((prices - cost[:, None])*demand).sum(axis=1),
+        'Method': np.where(~converged, 'QP', np.where(bounded, 'Active set', 'KKT')),
+        'Average Price': prices.mean(axis=1),
+    })
+
 # Create a new optimization model to maximize revenue
 model = gb.Model("Variable Pricing Model")
 
 # Construct the decision variables
 if isInteger:
-    p = model.addVars(7, lb=0, ub=40, vtype=GRB.INTEGER, name="Price")
-    d = model.addVars(7, lb=0, ub=1100, vtype=GRB.INTEGER, name="Daily Demand")
+    p = model.addVars(7, lb=0, ub=PRICE_CAP, vtype=GRB.INTEGER, name="Price")
+    d = model.addVars(7, lb=0, ub=DEMAND_CAP, vtype=GRB.INTEGER, name="Daily Demand")
 else:
-    p = model.addVars(7, lb=0, ub=40, vtype=GRB.CONTINUOUS, name="Price")
-    d = model.addVars(7, lb=0, ub=1100, vtype=GRB.CONTINUOUS, name="Daily Demand")
+    p = model.addVars(7, lb=0, ub=PRICE_CAP, vtype=GRB.CONTINUOUS, name="Price")
+    d = model.addVars(7, lb=0, ub=DEMAND_CAP, vtype=GRB.CONTINUOUS, name="Daily Demand")
 
 
 #Objective Function
-model.setObjective(gb.quicksum((p[n]-19)*d[n] for n in range(7)), GRB.MAXIMIZE)
+model.setObjective(gb.quicksum((p[n]-COST)*d[n] for n in range(7)), GRB.MAXIMIZE)
 
 # Demand is diverted from days of higher prices to days with lower prices
-model.addConstrs((d[n] == response[n][0] - response[n][1]*p[n] + 9*gb.quicksum(p[m] - p[n] for m in range(7)) for n in range(7)), "Demand Constraint")
+model.addConstrs((d[n] == response[n][0] - response[n][1]*p[n] + DIVERSION*gb.quicksum(p[m] - p[n] for m in range(7)) for n in range(7)), "Demand Constraint")
     
 # If variable pricing is not allowed, we must add constraints to ensure that
 # the price on each day of the week is the same. 
@@ -40,4 +194,26 @@ if not isVariablePricing:
 model.optimize()
 
 # Print the objective and decision variables
-model.printAttr('X')
\ No newline at end of file
+model.printAttr('X')
+
+# Did you want to run the parametric sweep?
+if PARAMETRIC:
+
+    # The closed form for the parameters above (exact, no branch and bound)
+    M = demand_matrix([r[1] for r in response], DIVERSION)
+    prices = kkt_prices([r[0] for r in response], M, COST, isVariablePricing)
+    demand = np.array([r[0] for r in response]) - M @ prices
+    print("\nClosed-form profit: %.2f" % ((prices - COST) @ demand))
+    print("Closed-form prices:", ['%.4f' % price for price in prices])
+
+    # Every combination of the grids with and without variable pricing
+    start = time.time()
+    results = pd.concat([sweep_variable_pricing(response, DIVERSIONS, COSTS, PRICE_CAPS, variable=variable) for variable in (True, False)])
+    print("\n%d cases in %.2f seconds (%d re-solved as QPs)" % (len(results), time.time() - start, (results['Method'] == 'QP').sum()))
+    print(results['Method'].value_counts().to_string())
+
+    # The value of variable pricing over the grid
+    gain = results.pivot_table(index=['Diversion', 'Cost', 'Price Cap'], columns='Variable', values='Profit')
+    gain = (gain[True] - gain[False]).groupby(level='Diversion').mean()
+    print("\nAverage gain of variable pricing by diversion coefficient:")
+    print(gain.iloc[::10].to_string(float_format=lambda x: f"{x:,.2f}"))
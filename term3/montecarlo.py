@@ -0,0 +1,155 @@
+"""
+@author: Adam Diamant (2025)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc, t
+
+# The default number of worker processes for the parallel runner
+WORKERS = 4
+
+# The low-discrepancy sequences that can replace the pseudo-random draws
+ENGINES = {'sobol': qmc.Sobol, 'halton': qmc.Halton}
+
+# A source of uniform and normal draws for the simulation scripts (Sales
+# Target, Insurance Policy). The simulators ask for n points in d dimensions
+# and use column j of every point for their j-th random input.
+class Sampler:
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def uniform(self, n, d=1):
+        return self.rng.random((n, d))
+
+    def normal(self, n, d=1):
+        return self.rng.standard_normal((n, d))
+
+# A scrambled Sobol or Halton sequence. Successive calls continue the same
+# sequence, so the dimension is fixed by the first call (and Sobol points are
+# best drawn in powers of 2). The normals are obtained by inverting the CDF.
+class QuasiSampler(Sampler):
+
+    def __init__(self, kind='sobol', seed=None):
+        super().__init__(seed)
+        self.kind = kind
+        self.engine = None
+
+    def uniform(self, n, d=1):
+        if self.engine is None:
+            self.engine = ENGINES[self.kind](d, scramble=True, seed=self.rng)
+        if d != self.engine.d:
+            raise ValueError("The %s sequence has %d dimensions, not %d" % (self.kind, self.engine.d, d))
+
+        # Keep the points away from 0 and 1 so that inverse CDFs stay finite
+        return np.clip(self.engine.random(n), 1e-12, 1 - 1e-12)
+
+    def normal(self, n, d=1):
+        return ndtri(self.uniform(n, d))
+
+# Create a sampler by name: 'random', 'sobol' or 'halton'
+def make_sampler(kind='random', seed=None):
+    if kind == 'random':
+        return Sampler(seed)
+    if kind in ENGINES:
+        return QuasiSampler(kind, seed)
+    raise ValueError("Unknown sampler '%s'" % kind)
+
+# Randomized quasi-Monte Carlo. estimate(sampler) returns one estimate from
+# a freshly scrambled sequence; the replicates are independent and unbiased
+# so their spread gives a valid standard error (with replicates - 1 degrees
+# of freedom). Returns the mean, its standard error and all the replicates.
+def randomized_qmc(estimate, kind='sobol', replicates=16, seed=None):
+    children = np.random.SeedSequence(seed).spawn(replicates)
+    estimates = np.array([estimate(make_sampler(kind, child)) for child in children])
+    return estimates.mean(), estimates.std(ddof=1)/np.sqrt(replicates), estimates
+
+# The two-sided 90%, 95% and 99% critical values: normal ones for plain Monte
+# Carlo, Student t ones when the standard error comes from a few replicates
+def critical_values(dof=None):
+    if dof is None:
+        return 1.645, 1.96, 2.575
+    return tuple(t.ppf([0.95, 0.975, 0.995], dof))
+
+# Streaming mean and variance. A batch of values is summarized by its count,
+# mean and sum of squared deviations (Welford), and summaries are combined
+# with the parallel formula of Chan et al., so no per-trial values are kept.
+# The values may be vectors (one column per statistic).
+class RunningStatistics:
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) > 0:
+            mean = values.mean(axis=0)
+            self.merge(RunningStatistics(len(values), mean, ((values - mean)**2).sum(axis=0)))
+
+    def merge(self, other):
+        count = self.count + other.count
+        if other.count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta*other.count/count
+        self.m2 = self.m2 + other.m2 + delta**2*self.count*other.count/count
+        self.count = count
+
+    def variance(self):
+        return self.m2/(self.count - 1)
+
+    def standard_error(self):
+        return np.sqrt(self.variance()/self.count)
+
+    # The half-width of the confidence interval with the given confidence level
+    def half_width(self, confidence=0.95):
+        return ndtri(0.5 + confidence/2)*self.standard_error()
+
+# Simulate one batch in a worker. simulate(rng, trials) returns the outcome
+# of every trial; only their summary is sent back to the parent process.
+def run_batch(simulate, seed, trials):
+    statistics = RunningStatistics()
+    statistics.update(simulate(np.random.default_rng(seed), trials))
+    return statistics
+
+# Run simulate(rng, trials) in batches of `batch` trials across worker
+# processes. Batch k always draws from the k-th child of SeedSequence(seed),
+# and the batches are merged in order, so the result does not depend on the
+# number of workers or on which worker ran which batch. If epsilon is given,
+# the simulation stops once the confidence interval half-width of every
+# statistic is below epsilon. The rule is checked after every merged batch
+# and the rest of the round is discarded, so the stopping point is the same
+# for any number of workers. Otherwise, and at most, max_trials trials are
+# simulated.
+def parallel_monte_carlo(simulate, max_trials, batch=100000, workers=WORKERS, epsilon=None, confidence=0.95, seed=None):
+
+    root = np.random.SeedSequence(seed)
+    statistics = RunningStatistics()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while statistics.count < max_trials:
+            sizes = [min(batch, max_trials - statistics.count - k*batch) for k in range(max(workers, 1))]
+            sizes = [size for size in sizes if size > 0]
+            children = root.spawn(len(sizes))
+            if pool is None:
+                results = map(run_batch, repeat(simulate), children, sizes)
+            else:
+                results = pool.map(run_batch, repeat(simulate), children, sizes)
+            converged = False
+            for result in results:
+                statistics.merge(result)
+                if epsilon is not None and statistics.count > 1 and np.all(statistics.half_width(confidence) < epsilon):
+                    converged = True
+                    break
+            if converged:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return statistics